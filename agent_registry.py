@@ -0,0 +1,39 @@
+import importlib
+
+# Agent name -> 'module:Class'. The module is only imported when its agent is selected, so that
+# e.g. networkx is only loaded for AgentsVersion2.
+AGENTS = {
+    'cbs': 'cbs_agent:CBSAgent',
+    'pp': 'astar_prioritized_planning:AgentsPrioritizedPlanning',
+    'astar': 'astar_base:AStarBase',
+    'greedy': 'greedyagent:GreedyAgents',
+    'greedy_optimal': 'greedyagent_optimal:GreedyAgentsOptimal',
+    'v0': 'agentversion0:AgentsVersion0',
+    'v1': 'agentversion1:AgentsVersion1',
+    'v2': 'agentversion2:AgentsVersion2',
+}
+
+_classes = {}
+
+
+def resolve_agent(name):
+    """
+    Returns the 'module:Class' spec of an agent name of AGENTS, or of a spec given as is.
+    """
+    if name in AGENTS:
+        return AGENTS[name]
+    if ':' not in name:
+        raise ValueError("Unknown agent %r, expected one of %s or module:Class." % (name, ', '.join(AGENTS)))
+    return name
+
+
+def load_agent(name):
+    """
+    Imports and returns the agent class of a name of AGENTS or of a 'module:Class' spec.
+    The classes are imported once per process.
+    """
+    spec = resolve_agent(name)
+    if spec not in _classes:
+        module_name, _, class_name = spec.partition(':')
+        _classes[spec] = getattr(importlib.import_module(module_name), class_name)
+    return _classes[spec]
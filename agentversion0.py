@@ -1,5 +1,6 @@
 import random
 from collections import deque
+from distance_oracle import get_oracle
 
 def compute_valid_position(map, position, move):
     r, c = position
@@ -82,43 +83,6 @@ def find_all_cycle(map, robots, actions):
             list_actions.append(action)
     return list_cycles, list_actions
 
-def get_shortest_path(map):
-    list_path = {}
-    map_position = []
-    n, m = len(map), len(map[0])
-    directions = [("U", (-1, 0)), ("L", (0, -1)), ("R", (0, 1)), ("D", (1, 0))]
-    for i in range(n):
-        for j in range(m):
-            if map[i][j] == 0:
-                map_position.append((i, j))
-
-    for i in range(len(map_position)):
-        dist = [[-1] * m for _ in range(n)]
-        str_path = [[""] * m for _ in range(n)]
-        queue = deque()
-
-        start_i, start_j = map_position[i]
-        queue.append((start_i, start_j))
-        dist[start_i][start_j] = 0
-        str_path[start_i][start_j] = ""
-
-        while queue:
-            x, y = queue.popleft()
-
-            for (direc_move, (di, dj)) in directions:
-                pos_i = x + di
-                pos_j = y + dj
-                if 0 < pos_i < n and 0 < pos_j < m and dist[pos_i][pos_j] == -1:
-                    if map[pos_i][pos_j] == 0:
-                        dist[pos_i][pos_j] = dist[x][y] + 1
-                        str_path[pos_i][pos_j] = str_path[x][y] + direc_move
-                        queue.append((pos_i, pos_j))
-
-                        start = (start_i + 1, start_j + 1)
-                        target = (pos_i + 1, pos_j + 1)
-                        list_path[(start, target)] = str_path[pos_i][pos_j]
-    return list_path
-
 class AgentsVersion0:
     def __init__(self):
         self.n_robots = 0
@@ -127,7 +91,7 @@ class AgentsVersion0:
         # add feature
         self.robots = []
         self.packages = []
-        self.board_path = {}
+        self.oracle = None # DistanceOracle của bản đồ, tọa độ tính từ 1 như state
         self.map = []
 
         self.waiting_packages = []
@@ -138,16 +102,20 @@ class AgentsVersion0:
         self.state = state
         self.n_robots = len(state['robots'])
         self.map = state['map']
-        self.board_path = get_shortest_path(state['map'])
+        self.oracle = get_oracle(state['map'], origin=1)
         self.robots = [(robot[0], robot[1], 0) for robot in state['robots']]
 
     def differ_connected(self, start, target):
-        return (start, target) not in self.board_path
+        # Một ô không được coi là nối với chính nó, như bảng board_path cũ
+        return start == target or not self.oracle.connected(start, target)
 
     def get_action(self, start, target):
         if start == target:
             return ""
-        return self.board_path[(start, target)]
+        path = self.oracle.path(start, target)
+        if path is None:
+            raise KeyError((start, target))
+        return path
 
     def get_actions(self, state):
         actions = []
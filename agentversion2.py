@@ -1,5 +1,6 @@
 import random
 from collections import deque
+from distance_oracle import get_oracle
 import networkx as nx
 
 # Các vị trí các ô trên board, vị trí robots, packages đều tính từ 1
@@ -111,56 +112,13 @@ def find_all_cycle(map, robots, actions):
     return list_cycles, list_actions
 
 # Tìm 1 đường đi ngắn nhất giữa 2 ô không bị chặn (2 ô phân biệt chứa sô 0 trên board)
-def get_shortest_path(map):
-    list_path = {}
-    valid_pos = []
-    m, n = len(map), len(map[0])
-    directions = [("U", (-1, 0)), ("L", (0, -1)), ("R", (0, 1)), ("D", (1, 0))]
-
-    # Lưu những vị trí không bị chặn
-    for i in range(m):
-        for j in range(n):
-            if map[i][j] == 0:
-                valid_pos.append((i, j))
-
-    # Tại mỗi vị trí không bị chặn, dùng BFS để tìm đường đi ngắn nhất tới tất cả các vị trí khác
-    for i in range(len(valid_pos)):
-        dist = [[-1] * n for _ in range(m)] # Mảng 2 chiều đánh dấu những vị trí được xét hay chưa (nếu = 0)
-        str_path = [[""] * n for _ in range(m)] # Mảng 2 chiều lưu đường đi từ vị trí xét đến vị trí hiện tại
-        # Có thể xử lý theo lưu tất cả đường có thể, để sau có chiến thuật lựa chọn nào đó
-
-        queue = deque()
-        queue.append(valid_pos[i])
-
-        start_i, start_j = valid_pos[i]
-        dist[start_i][start_j] = 0
-        str_path[start_i][start_j] = ""
-
-        while queue:
-            x, y = queue.popleft()
-
-            # random.shuffle(directions) # có thể shuffle lên để tìm kiếm những hướng đi mới
-            for (direc_move, (d_x, d_y)) in directions:
-                pos_x = x + d_x
-                pos_y = y + d_y
-                if 0 < pos_x < m and 0 < pos_y < n and dist[pos_x][pos_y] == -1:
-                    if map[pos_x][pos_y] == 0:
-                        dist[pos_x][pos_y] = dist[x][y] + 1
-                        str_path[pos_x][pos_y] = str_path[x][y] + direc_move
-                        queue.append((pos_x, pos_y))
-
-                        start = (start_i + 1, start_j + 1)
-                        target = (pos_x + 1, pos_y + 1)
-                        list_path[(start, target)] = str_path[pos_x][pos_y]
-    return list_path
-
 # Khởi tạo agents
 class AgentsVersion2:
     # Khởi tạo mặc định
     def __init__(self):
         self.state = None
         self.map = []
-        self.board_path = {} # Ánh xạ (start_pos, target_pos) với đường đi giữa 2 v trí
+        self.oracle = None # DistanceOracle của bản đồ, tọa độ tính từ 1 như state
         self.robots = [] # Lưu thông tin của các robot (trước khi nhận state mới)
         self.packages = {} # Lưu tất cả packages đã xuất hiện (dùng map để dễ truy cập thông qua id mà không cần quan tâm thứ tự trong mảng)
         self.waiting_packages = [] # Danh sách gói hàng trong trạng thái chờ
@@ -176,20 +134,24 @@ class AgentsVersion2:
     def init_agents(self, state):
         self.state = state
         self.map = state['map']
-        self.board_path = get_shortest_path(state['map'])
+        self.oracle = get_oracle(state['map'], origin=1)
         self.robots = [(robot[0], robot[1], 0) for robot in state['robots']]
         self.count_repeat = [0] * len(state['robots'])
 
     # Kiểm tra 2 vị trí có cùng thành phần liên thông không
     def differ_connected(self, start, target):
-        return (start, target) not in self.board_path
+        # Một ô không được coi là nối với chính nó, như bảng board_path cũ
+        return start == target or not self.oracle.connected(start, target)
 
     # Lấy str biểu diễn đường đi từ start tới target (khác hoàn toàn target tơi start)
     def get_action(self, start, target):
         # Nếu 2 vị trí trùng nhau tức là không cần di chuyển
         if start == target:
             return ""
-        return self.board_path[(start, target)]
+        path = self.oracle.path(start, target)
+        if path is None:
+            raise KeyError((start, target))
+        return path
 
     # Dùng luồng để tìm tìm tổng đường đi ngắn nhất cho tất cả robot / tất cả gói hàng hiện có
     def optimal_assign(self, now_step, robots, packages, alpha=1, beta=1):
@@ -2,6 +2,11 @@ import heapq
 import random
 import numpy as np
 from utils import (manhattan_distance, euclidean_distance, diagonal_distance)
+from distance_fields import get_field_cache
+from junction_graph import get_junction_graph
+from incremental_planner import DStarLite
+from landmarks import get_landmark_heuristic
+from sipp import SafeIntervalPlanner
 
 
 PICKUP = '1'    # Nhặt gói hàng
@@ -59,6 +64,36 @@ class AStarBase:
             return path[1]
         return start_pos
 
+    def get_replanned_next_pos(self, robot_idx, start_pos, target_pos):
+        """
+        Vị trí tiếp theo của robot robot_idx khi tránh các ô đang có robot khác đứng. Bộ lập kế hoạch D* Lite của
+        robot được giữ lại giữa các bước nên chỉ phần bị ảnh hưởng bởi các robot vừa di chuyển được tính lại.
+        Nếu các robot khác chặn hết đường, dùng đường đi tĩnh của get_next_pos.
+        Args:
+            robot_idx: int, chỉ số robot
+            start_pos: tuple(x1, y1)
+            target_pos: tuple(x2, y2)
+        Returns:
+            tuple: Vị trí tiếp theo cần di chuyển đến
+        """
+        if not self.incremental_replanning:
+            return self.get_next_pos(start_pos, target_pos)
+
+        n_cols = len(self.grid_map[0])
+        goal = target_pos[0] * n_cols + target_pos[1]
+        planner = self.planners.get(robot_idx)
+        if planner is None or planner.goal != goal:
+            planner = DStarLite(self.cell_neighbors, n_cols, goal)
+            self.planners[robot_idx] = planner
+        start = start_pos[0] * n_cols + start_pos[1]
+        planner.move_start(start)
+        planner.set_blocked(r[0] * n_cols + r[1] for i, r in enumerate(self.robot_states)
+                            if i != robot_idx and (r[0], r[1]) != start_pos)
+        next_cell = planner.next_cell()
+        if next_cell is None:
+            return self.get_next_pos(start_pos, target_pos)
+        return divmod(next_cell, n_cols)
+
     def __init__(self):
         """Khởi tạo agent"""
         self.num_robots = 0
@@ -69,6 +104,20 @@ class AStarBase:
         self.in_transit_packages = set()
         self.delivered_packages = set()
         self.path_cache = {}
+        self.distance_fields = None  # Trường khoảng cách BFS tới từng đích, dùng chung theo bản đồ
+        # Tìm đường tĩnh trên đồ thị nút giao (hành lang được rút gọn thành cạnh)
+        self.use_junction_graph = False
+        self.junction_graph = None
+        self.cell_neighbors = []  # Chỉ số phẳng các ô trống kề (4 hướng) của mỗi ô
+        # Tìm đường tránh các robot khác bằng D* Lite giữ riêng cho mỗi robot, sửa lại khi các robot di chuyển
+        self.incremental_replanning = False
+        self.planners = {}  # robot_idx -> DStarLite tới đích hiện tại của robot
+        # Heuristic landmark (ALT) cho các tìm kiếm A* có ràng buộc thời gian của PP và CBS
+        self.use_landmarks = False
+        self.landmarks = None
+        # Tìm kiếm mức thấp của PP và CBS theo khoảng an toàn (SIPP) thay vì từng trạng thái (ô, t)
+        self.use_sipp = False
+        self.safe_interval_planner = None
 
     def init_agents(self, state):
         """
@@ -77,6 +126,11 @@ class AStarBase:
             state: dict, trạng thái môi trường
         """
         self.grid_map = state['map']
+        self.distance_fields = get_field_cache(self.grid_map)
+        self.junction_graph = get_junction_graph(self.grid_map) if self.use_junction_graph else None
+        self.cell_neighbors = [[n for n in row if n >= 0] for row in self.distance_fields.neighbors.tolist()]
+        self.landmarks = get_landmark_heuristic(self.grid_map) if self.use_landmarks else None
+        self.safe_interval_planner = SafeIntervalPlanner(self.grid_map)
         self.num_robots = len(state['robots'])
         self.robot_states = [(r[0]-1, r[1]-1, r[2]) for r in state['robots']]
         
@@ -86,6 +140,7 @@ class AStarBase:
         self.in_transit_packages.clear()
         self.delivered_packages.clear()
         self.path_cache.clear()
+        self.planners.clear()
         
         # Khởi tạo thông tin gói hàng
         for pkg in state['packages']:
@@ -96,66 +151,85 @@ class AStarBase:
 
     def a_star_search(self, start_pos, goal_pos, heuristic_type='manhattan'):
         """
-        Thuật toán A* tìm đường đi từ điểm bắt đầu đến điểm đích
+        Thuật toán A* tìm đường đi từ điểm bắt đầu đến điểm đích, đi 4 hướng như môi trường.
+        Ô được đánh số phẳng (hàng * số cột + cột); g-score và ô cha lưu trong mảng theo chỉ số ô, đường đi
+        chỉ được dựng lại một lần khi tới đích. Khi f bằng nhau, ô có g lớn hơn (gần đích hơn) được mở trước.
         Args:
             start_pos: tuple(x1, y1)
             goal_pos: tuple(x2, y2)
-            heuristic_type: str, loại heuristic ('manhattan', 'euclidean', 'diagonal')
+            heuristic_type: str, loại heuristic ('manhattan', 'euclidean', 'diagonal', 'landmarks': cận dưới ALT
+                từ các landmark của bản đồ, hoặc 'exact': khoảng cách BFS thật lấy từ trường khoảng cách dùng chung)
         Returns:
-            list: Danh sách các điểm trên đường đi
+            list: Danh sách các điểm trên đường đi, rỗng nếu không tìm thấy
         """
         # Kiểm tra cache
         path_key = (start_pos, goal_pos)
         if path_key in self.path_cache:
             return self.path_cache[path_key]
 
-        # Chọn hàm heuristic
-        heuristic_func = {
-            'manhattan': manhattan_distance,
-            'euclidean': euclidean_distance,
-            'diagonal': diagonal_distance
-        }.get(heuristic_type, manhattan_distance)
+        if self.junction_graph is not None:
+            # A* chỉ mở rộng các nút giao, đường đi theo ô được dựng lại từ các cạnh
+            path = self.junction_graph.shortest_path(start_pos, goal_pos)
+            if path is None:
+                return []
+            self.path_cache[path_key] = path
+            return path
 
-        # Khởi tạo open set và closed set
-        open_set = [(0 + heuristic_func(start_pos, goal_pos), 0, start_pos, [])]
-        closed_set = set()
+        n_cols = len(self.grid_map[0])
+        start = start_pos[0] * n_cols + start_pos[1]
+        goal = goal_pos[0] * n_cols + goal_pos[1]
+        if self.grid_map[start_pos[0]][start_pos[1]] == 1 or self.grid_map[goal_pos[0]][goal_pos[1]] == 1:
+            return []
 
-        # Các hướng di chuyển (8 hướng)
-        directions = [(0,1), (1,0), (0,-1), (-1,0), 
-                     (1,1), (1,-1), (-1,1), (-1,-1)]
+        # Chọn hàm heuristic
+        if heuristic_type == 'exact':
+            heuristic = self.distance_fields.field(goal_pos).reshape(-1).item
+            if heuristic(start) < 0:
+                return []  # Đích không đến được
+        elif heuristic_type == 'landmarks':
+            goal_heuristic = (self.landmarks or get_landmark_heuristic(self.grid_map)).to(goal_pos)
+            if goal_heuristic(start_pos) < 0:
+                return []  # Đích không đến được
+            heuristic = lambda cell: goal_heuristic(divmod(cell, n_cols))
+        else:
+            heuristic_func = {
+                'manhattan': manhattan_distance,
+                'euclidean': euclidean_distance,
+                'diagonal': diagonal_distance
+            }.get(heuristic_type, manhattan_distance)
+            heuristic = lambda cell: heuristic_func(divmod(cell, n_cols), goal_pos)
+
+        # g-score, ô cha và trạng thái đóng của mỗi ô
+        n_cells = len(self.cell_neighbors)
+        g_score = [float('inf')] * n_cells
+        parent = [-1] * n_cells
+        closed = bytearray(n_cells)
+        g_score[start] = 0
+        open_set = [(heuristic(start), 0, start)]  # (f_score, -g_score, ô)
 
         while open_set:
-            f_score, g_score, current_pos, path = heapq.heappop(open_set)
-            
-            if current_pos in closed_set:
+            f_score, neg_g, current = heapq.heappop(open_set)
+            if closed[current]:
                 continue
-            closed_set.add(current_pos)
+            closed[current] = 1
 
-            if current_pos == goal_pos:
-                final_path = path + [current_pos]
-                self.path_cache[path_key] = final_path
-                return final_path
+            if current == goal:
+                path = []
+                while current != -1:
+                    path.append(divmod(current, n_cols))
+                    current = parent[current]
+                path.reverse()
+                self.path_cache[path_key] = path
+                return path
 
             # Xét các ô lân cận
-            for dx, dy in directions:
-                next_x = current_pos[0] + dx
-                next_y = current_pos[1] + dy
-                next_pos = (next_x, next_y)
-
-                # Kiểm tra điều kiện hợp lệ
-                if (next_x < 0 or next_x >= len(self.grid_map) or 
-                    next_y < 0 or next_y >= len(self.grid_map[0]) or
-                    self.grid_map[next_x][next_y] == 1 or
-                    next_pos in closed_set):
+            new_g_score = 1 - neg_g
+            for next_cell in self.cell_neighbors[current]:
+                if closed[next_cell] or new_g_score >= g_score[next_cell]:
                     continue
-
-                # Tính điểm mới
-                movement_cost = 1.4 if dx*dy != 0 else 1.0  # Chi phí cao hơn cho di chuyển chéo
-                new_g_score = g_score + movement_cost
-                new_h_score = heuristic_func(next_pos, goal_pos)
-                new_f_score = new_g_score + new_h_score
-
-                heapq.heappush(open_set, (new_f_score, new_g_score, next_pos, path + [current_pos]))
+                g_score[next_cell] = new_g_score
+                parent[next_cell] = current
+                heapq.heappush(open_set, (new_g_score + heuristic(next_cell), -new_g_score, next_cell))
 
         return []
 
@@ -194,7 +268,7 @@ class AStarBase:
                     self.in_transit_packages.remove(carrying_pkg)
                     self.delivered_packages.add(carrying_pkg)
                 else:  # Di chuyển đến đích
-                    next_pos = self.get_next_pos(robot_pos, target_pos)
+                    next_pos = self.get_replanned_next_pos(robot_idx, robot_pos, target_pos)
                     move = self.get_movement_direction(robot_pos, next_pos)
                     actions.append((move, WAIT))
             else:  # Robot chưa mang gói hàng
@@ -219,7 +293,7 @@ class AStarBase:
                             self.waiting_packages.remove(nearest_pkg)
                             self.in_transit_packages.add(nearest_pkg)
                         else:  # Di chuyển đến gói hàng
-                            next_pos = self.get_next_pos(robot_pos, pkg_pos)
+                            next_pos = self.get_replanned_next_pos(robot_idx, robot_pos, pkg_pos)
                             move = self.get_movement_direction(robot_pos, next_pos)
                             actions.append((move, WAIT))
                 else:  # Không có gói hàng để nhặt
@@ -1,5 +1,6 @@
 import time as timer
 from astar_base import AStarBase
+from reservation_table import ReservationTable
 import numpy as np
 import heapq
 
@@ -15,29 +16,23 @@ class AgentsPrioritizedPlanning(AStarBase):
     def __init__(self):
         super().__init__()
         self.paths = {}  # Lưu trữ đường đi đã tính toán cho mỗi robot
-        self.constraints = []  # Lưu trữ các ràng buộc cho việc tìm đường
-        self.heuristics = {}  # Lưu trữ giá trị heuristic cho mỗi vị trí đích
+        self.constraints = ReservationTable()  # Các ô và cạnh đã được robot ưu tiên hơn đặt trước
+        self.max_delay = 50  # Số bước chờ tối đa so với đường đi ngắn nhất khi tránh các robot khác
         
     def compute_heuristics(self, target_pos):
         """
-        Tính toán heuristic khoảng cách Manhattan đến vị trí đích cho tất cả các ô trên lưới
+        Heuristic chính xác: khoảng cách BFS từ mỗi ô đến vị trí đích, lấy từ bộ nhớ đệm trường khoảng cách
+        dùng chung (giới hạn bộ nhớ, LRU) thay vì một bảng Manhattan cho mỗi đích. Khi bật use_landmarks,
+        dùng cận dưới ALT từ các landmark của bản đồ, không cần một trường cho mỗi đích
         
         Args:
             target_pos: Vị trí đích cần tính heuristic
         Returns:
-            Dictionary chứa giá trị heuristic từ mỗi ô đến đích
+            Bảng h[pos] chứa khoảng cách (hoặc cận dưới) từ mỗi ô đến đích, -1 nếu không đến được
         """
-        if target_pos in self.heuristics:
-            return self.heuristics[target_pos]
-            
-        heuristic = {}
-        for i in range(len(self.grid_map)):
-            for j in range(len(self.grid_map[0])):
-                if self.grid_map[i][j] == 0:  # Chỉ tính cho các ô không phải vật cản
-                    heuristic[(i, j)] = abs(target_pos[0] - i) + abs(target_pos[1] - j)
-                    
-        self.heuristics[target_pos] = heuristic
-        return heuristic
+        if self.landmarks is not None:
+            return self.landmarks.to(target_pos)
+        return self.distance_fields.field(target_pos)
 
     def check_constraints(self, pos, next_pos, time_step, agent_id, constraints):
         """
@@ -46,21 +41,15 @@ class AgentsPrioritizedPlanning(AStarBase):
         Args:
             pos: Vị trí hiện tại
             next_pos: Vị trí kế tiếp
-            time_step: Thời điểm hiện tại
+            time_step: Thời điểm tới next_pos
             agent_id: ID của robot
-            constraints: Danh sách các ràng buộc
+            constraints: ReservationTable chứa các ô và cạnh đã được đặt trước
         Returns:
-            True nếu di chuyển hợp lệ, False nếu vi phạm ràng buộc
+            True nếu di chuyển hợp lệ, False nếu vi phạm ràng buộc vị trí (vertex) hoặc cạnh (edge)
         """
-        for constraint in constraints:
-            if constraint['agent'] == agent_id and constraint['timestep'] == time_step:
-                if len(constraint['loc']) == 1 and constraint['loc'][0] == next_pos:
-                    return False  # Vi phạm ràng buộc vị trí (vertex constraint)
-                elif len(constraint['loc']) == 2 and constraint['loc'][0] == next_pos and constraint['loc'][1] == pos:
-                    return False  # Vi phạm ràng buộc cạnh (edge constraint)
-        return True
-
-    def a_star_with_constraints(self, start_pos, goal_pos, agent_id, constraints):
+        return constraints.move_free(pos, next_pos, time_step, agent_id)
+
+    def a_star_with_constraints(self, start_pos, goal_pos, agent_id, constraints, start_time=0, hold_goal=False):
         """
         Thuật toán A* có xét đến các ràng buộc thời gian
         
@@ -68,18 +57,21 @@ class AgentsPrioritizedPlanning(AStarBase):
             start_pos: Vị trí bắt đầu
             goal_pos: Vị trí đích
             agent_id: ID của robot
-            constraints: Danh sách các ràng buộc
+            constraints: ReservationTable chứa các ô và cạnh đã được đặt trước
+            start_time: Bước thời gian (tuyệt đối) tại start_pos, cùng mốc với các đặt chỗ
+            hold_goal: Chỉ nhận đích nếu robot có thể đứng lại đó mãi (không ai đặt ô đích sau đó)
         Returns:
-            Đường đi từ vị trí bắt đầu đến đích nếu tìm thấy, ngược lại trả về None
+            Đường đi từ vị trí bắt đầu đến đích nếu tìm thấy trong max_delay bước chờ, ngược lại trả về None
         """
-        # Kiểm tra cache
-        path_key = (start_pos, goal_pos)
-        if path_key in self.path_cache:
-            return self.path_cache[path_key]
-
         # Khởi tạo open set và closed set
         heuristic = self.compute_heuristics(goal_pos)
-        open_set = [(heuristic[start_pos], 0, start_pos, [])]  # (f_score, time_step, current_pos, path)
+        if heuristic[start_pos] < 0:
+            return None  # Đích không đến được từ vị trí bắt đầu
+        if self.use_sipp:
+            return self.safe_interval_planner.search(start_pos, goal_pos, constraints, lambda pos: heuristic[pos],
+                                                     start_time, agent_id, hold_goal)
+        max_time = start_time + heuristic[start_pos] + self.max_delay
+        open_set = [(heuristic[start_pos], start_time, start_pos, [])]  # (f_score, time_step, current_pos, path)
         closed_set = set()
 
         # Các hướng di chuyển (4 hướng)
@@ -93,16 +85,16 @@ class AgentsPrioritizedPlanning(AStarBase):
                 continue
             closed_set.add(state_key)
 
-            if current_pos == goal_pos:
-                final_path = path + [current_pos]
-                self.path_cache[path_key] = final_path
-                return final_path
+            if current_pos == goal_pos and (not hold_goal or constraints.can_hold(goal_pos, time_step, agent_id)):
+                return path + [current_pos]
+            if time_step >= max_time:
+                continue
 
             # Xét trường hợp đứng yên tại vị trí hiện tại
             next_pos = current_pos
             if self.check_constraints(current_pos, next_pos, time_step + 1, agent_id, constraints):
                 new_path = path + [next_pos]
-                new_f = len(new_path) - 1 + heuristic[next_pos]
+                new_f = time_step + 1 + heuristic[next_pos]
                 heapq.heappush(open_set, (new_f, time_step + 1, next_pos, new_path))
 
             # Xét các ô lân cận
@@ -114,7 +106,7 @@ class AgentsPrioritizedPlanning(AStarBase):
                 # Kiểm tra điều kiện hợp lệ
                 if (next_x < 0 or next_x >= len(self.grid_map) or 
                     next_y < 0 or next_y >= len(self.grid_map[0]) or
-                    self.grid_map[next_x][next_y] == 1 or
+                    heuristic[next_pos] < 0 or
                     (next_pos, time_step + 1) in closed_set):
                     continue
 
@@ -131,6 +123,26 @@ class AgentsPrioritizedPlanning(AStarBase):
 
         return None  # Không tìm thấy đường đi
 
+    def plan_move(self, robot_idx, robot_pos, goal_pos, time_step):
+        """
+        Tìm đường tránh các đặt chỗ của các robot ưu tiên hơn rồi đặt chỗ cả đường đi (và thêm một bước ở đích
+        cho thao tác nhặt/thả hàng) cho các robot sau
+        
+        Args:
+            robot_idx: ID của robot
+            robot_pos: Vị trí hiện tại
+            goal_pos: Vị trí đích
+            time_step: Bước thời gian hiện tại của môi trường
+        Returns:
+            Hướng di chuyển ở bước tiếp theo, 'S' nếu không tìm thấy đường đi
+        """
+        path = self.a_star_with_constraints(robot_pos, goal_pos, robot_idx, self.constraints, time_step)
+        if not path or len(path) < 2:
+            return 'S'  # Đứng yên nếu không tìm thấy đường đi
+        self.paths[robot_idx] = path
+        self.constraints.reserve_path(path + [path[-1]], time_step, robot_idx)
+        return self.get_movement_direction(robot_pos, path[1])
+
     def get_actions(self, state):
         """
         Lấy hành động cho tất cả robot sử dụng phương pháp Prioritized Planning
@@ -161,6 +173,7 @@ class AgentsPrioritizedPlanning(AStarBase):
         for robot_idx, robot_state in enumerate(self.robot_states):
             robot_pos = (robot_state[0], robot_state[1])
             carrying_pkg = robot_state[2]
+            idle = False
 
             if carrying_pkg > 0:  # Robot đang mang gói hàng
                 pkg_info = self.package_info[carrying_pkg]
@@ -168,25 +181,12 @@ class AgentsPrioritizedPlanning(AStarBase):
                 
                 if robot_pos == target_pos:  # Tại vị trí giao hàng
                     actions.append(('S', '2'))  # Thả gói hàng
-                    self.in_transit_packages.remove(carrying_pkg)
+                    # Robot có thể đã nhặt một gói khác cùng ô với gói được chọn
+                    self.waiting_packages.discard(carrying_pkg)
+                    self.in_transit_packages.discard(carrying_pkg)
                     self.delivered_packages.add(carrying_pkg)
                 else:  # Cần di chuyển đến vị trí giao hàng
-                    path = self.a_star_with_constraints(robot_pos, target_pos, robot_idx, self.constraints)
-                    if path and len(path) > 1:
-                        next_pos = path[1]
-                        move = self.get_movement_direction(robot_pos, next_pos)
-                        actions.append((move, '0'))
-                        # Thêm ràng buộc cho các robot khác
-                        for other_robot in range(len(self.robot_states)):
-                            if other_robot != robot_idx:
-                                self.constraints.append({
-                                    'agent': other_robot,
-                                    'loc': [next_pos],
-                                    'timestep': state['time_step'] + 1,
-                                    'final': False
-                                })
-                    else:
-                        actions.append(('S', '0'))  # Đứng yên nếu không tìm thấy đường đi
+                    actions.append((self.plan_move(robot_idx, robot_pos, target_pos, state['time_step']), '0'))
                         
             else:  # Robot không mang gói hàng
                 if self.waiting_packages:  # Có gói hàng cần nhặt
@@ -210,25 +210,15 @@ class AgentsPrioritizedPlanning(AStarBase):
                             self.waiting_packages.remove(nearest_pkg)
                             self.in_transit_packages.add(nearest_pkg)
                         else:  # Cần di chuyển đến vị trí nhặt hàng
-                            path = self.a_star_with_constraints(robot_pos, pkg_pos, robot_idx, self.constraints)
-                            if path and len(path) > 1:
-                                next_pos = path[1]
-                                move = self.get_movement_direction(robot_pos, next_pos)
-                                actions.append((move, '0'))
-                                # Thêm ràng buộc cho các robot khác
-                                for other_robot in range(len(self.robot_states)):
-                                    if other_robot != robot_idx:
-                                        self.constraints.append({
-                                            'agent': other_robot,
-                                            'loc': [next_pos],
-                                            'timestep': state['time_step'] + 1,
-                                            'final': False
-                                        })
-                            else:
-                                actions.append(('S', '0'))  # Đứng yên nếu không tìm thấy đường đi
+                            actions.append((self.plan_move(robot_idx, robot_pos, pkg_pos, state['time_step']), '0'))
                     else:
                         actions.append(('S', '0'))  # Đứng yên nếu không tìm thấy gói hàng
                 else:
                     actions.append(('S', '0'))  # Không có gói hàng để nhặt
+                    idle = True
+
+            if actions[-1][0] == 'S':
+                # Robot đứng yên: giữ ô hiện tại ở bước tiếp theo, hoặc giữ mãi (goal hold) nếu không còn việc
+                self.constraints.reserve_path([robot_pos, robot_pos], state['time_step'], robot_idx, hold_goal=idle)
                     
         return actions
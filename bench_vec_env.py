@@ -0,0 +1,78 @@
+"""
+Measures the env-steps/s of VecEnvironment against a loop over Environment objects, both stepping the same
+episodes with the same random integer actions (Environment.step_array, its fastest API).
+
+    python bench_vec_env.py sweep.json --n_envs 64 256 1024 --steps 200
+    python bench_vec_env.py --maps map1.txt --num_agents 5 --n_packages 100
+
+The map configurations come from the "maps" entry of a sweep file (see sweep.py) or from the command line.
+"""
+import json
+import time
+
+import numpy as np
+
+from env import Environment
+from sweep import DEFAULTS
+from vec_env import VecEnvironment
+
+
+def benchmark(map_file, n_envs, n_robots, n_packages, max_time_steps, steps, seed=0):
+    """
+    Steps n_envs episodes for steps time steps (at most max_time_steps) both ways.
+    :return: (loop env-steps/s, VecEnvironment env-steps/s).
+    """
+    steps = min(steps, max_time_steps)
+    seeds = list(range(seed, seed + n_envs))
+    rng = np.random.default_rng(seed)
+    actions = np.stack([rng.integers(0, 5, (steps, n_envs, n_robots)),
+                        rng.integers(0, 3, (steps, n_envs, n_robots))], axis=-1).astype(np.int8)
+
+    envs = [Environment(map_file, max_time_steps, n_robots, n_packages, seed=s) for s in seeds]
+    for env in envs:
+        env.reset()
+    start = time.perf_counter()
+    for t in range(steps):
+        for env, env_actions in zip(envs, actions[t]):
+            env.step_array(env_actions)
+    loop_rate = steps * n_envs / (time.perf_counter() - start)
+
+    vec = VecEnvironment(map_file, seeds, max_time_steps, n_robots, n_packages)
+    vec.reset()
+    start = time.perf_counter()
+    for t in range(steps):
+        vec.step(actions[t])
+    vec_rate = steps * n_envs / (time.perf_counter() - start)
+    return loop_rate, vec_rate
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark VecEnvironment against a loop over Environment")
+    parser.add_argument("sweep", type=str, nargs='?', default=None, help="Sweep file whose maps are measured")
+    parser.add_argument("--maps", type=str, nargs='+', default=["map1.txt"], help="Map names")
+    parser.add_argument("--num_agents", type=int, default=DEFAULTS['num_agents'])
+    parser.add_argument("--n_packages", type=int, default=DEFAULTS['n_packages'])
+    parser.add_argument("--max_time_steps", type=int, default=DEFAULTS['max_time_steps'])
+    parser.add_argument("--n_envs", type=int, nargs='+', default=[256], help="Numbers of episodes stepped together")
+    parser.add_argument("--steps", type=int, default=200, help="Time steps measured")
+    args = parser.parse_args()
+
+    if args.sweep is not None:
+        with open(args.sweep) as f:
+            sweep = json.load(f)
+        max_time_steps = sweep.get('max_time_steps', [args.max_time_steps])[0]
+        configs = []
+        for entry in sweep['maps']:
+            entry = entry if isinstance(entry, dict) else {'map': entry}
+            configs.append((entry['map'], entry.get('num_agents', args.num_agents),
+                            entry.get('n_packages', args.n_packages), entry.get('max_time_steps', max_time_steps)))
+    else:
+        configs = [(map_file, args.num_agents, args.n_packages, args.max_time_steps) for map_file in args.maps]
+
+    print("map        robots packages  envs   loop steps/s    vec steps/s  speedup")
+    for map_file, n_robots, n_packages, max_time_steps in configs:
+        for n_envs in args.n_envs:
+            loop_rate, vec_rate = benchmark(map_file, n_envs, n_robots, n_packages, max_time_steps, args.steps)
+            print("%-10s %6d %8d %5d %14.0f %14.0f %7.1fx" % (map_file, n_robots, n_packages, n_envs,
+                                                             loop_rate, vec_rate, vec_rate / loop_rate))
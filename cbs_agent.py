@@ -4,6 +4,7 @@ import numpy as np
 import copy
 from collections import deque
 from utils import manhattan_distance
+from sipp import constraints_to_reservations
 
 
 class CBSAgent(AStarBase):
@@ -19,6 +20,9 @@ class CBSAgent(AStarBase):
         self.best_solution = None  # Lưu giải pháp tốt nhất tìm được
         self.position_history = {}  # Lưu lịch sử vị trí của robot
         self.stuck_count = {}  # Đếm số lần robot bị kẹt tại một vị trí
+        # Dùng khoảng cách BFS (trường khoảng cách dùng chung) làm heuristic thay cho Manhattan: A* tìm được
+        # đường dài hơn trong max_time bước nên CBS giải nhiều xung đột hơn, nhưng chậm hơn nhiều trên bản đồ lớn
+        self.exact_heuristic = False
 
     def init_agents(self, state):
         """Khởi tạo agent với trạng thái ban đầu"""
@@ -40,8 +44,29 @@ class CBSAgent(AStarBase):
         if start == goal:
             return [start]
         
-        # Sử dụng hàm heuristic từ lớp cơ sở
-        open_set = [(manhattan_distance(start, goal), 0, start, [])]
+        if self.junction_graph is not None and not constraints:
+            # Không có ràng buộc: đường ngắn nhất trên đồ thị nút giao, không giới hạn bởi max_time
+            return self.junction_graph.shortest_path(start, goal)
+        
+        if self.exact_heuristic:
+            # Khoảng cách BFS đến đích, -1 nếu không đến được
+            field = self.distance_fields.field(goal)
+            if field[start] < 0:
+                return None
+            heuristic = lambda pos: int(field[pos])
+        elif self.landmarks is not None:
+            # Cận dưới ALT, -1 nếu không đến được
+            heuristic = self.landmarks.to(goal)
+            if heuristic(start) < 0:
+                return None
+        else:
+            heuristic = lambda pos: manhattan_distance(pos, goal)
+        
+        if self.use_sipp:
+            # Khoảng an toàn dựng từ các ràng buộc, không giới hạn bởi max_time
+            return self.safe_interval_planner.search(start, goal, constraints_to_reservations(constraints),
+                                                     heuristic, owner=robot_id)
+        open_set = [(heuristic(start), 0, start, [])]
         closed_set = set()
         
         # Các hướng di chuyển (4 hướng + đứng yên)
@@ -74,9 +99,14 @@ class CBSAgent(AStarBase):
                 if not self._check_constraints(next_pos, current, next_time, robot_id, constraints):
                     continue
                 
+                # Bỏ qua ô không còn đến được đích
+                h = heuristic(next_pos)
+                if h < 0:
+                    continue
+                
                 # Thêm vào open set
                 new_g = next_time
-                new_f = new_g + manhattan_distance(next_pos, goal)
+                new_f = new_g + h
                 heapq.heappush(open_set, (new_f, new_g, next_pos, path + [current]))
             
             time_step += 1
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Các hướng đi theo tọa độ (hàng, cột) tính từ 0 như trong các agent A*, tham lam và CBS.
+MOVES = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+UNREACHABLE = -1
+# Giới hạn bộ nhớ mặc định cho các trường khoảng cách của một bản đồ (byte).
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def wavefront_bfs(neighbors, sources, dtype=np.int16):
+    """
+    BFS từ K nguồn cùng lúc. Mỗi ô giữ một bitset K bit (các từ uint64) cho biết những nguồn nào đã tới ô đó;
+    mỗi lớp của BFS là một phép OR các bitset của 4 ô kề cho mọi ô, nên số lệnh numpy chỉ tỉ lệ với đường kính
+    của bản đồ chứ không với K.
+    Args:
+        neighbors: Mảng [V, 4] chỉ số ô kề, -1 nếu không có; đồ thị phải vô hướng (v kề u khi u kề v).
+        sources: Chỉ số K ô nguồn.
+        dtype: Kiểu của kết quả.
+    Returns:
+        Mảng [K, V]: số bước ngắn nhất từ nguồn k tới ô v, -1 nếu không tới được.
+    """
+    sources = np.asarray(sources, dtype=np.int64).reshape(-1)
+    V, K = len(neighbors), len(sources)
+    W = (K + 63) // 64
+    if K == 0:
+        return np.full((0, V), UNREACHABLE, dtype=dtype)
+    # Kết quả được ghi theo ô: hàng v gồm W khối 64 nguồn, khớp với các từ của bitset.
+    dist = np.full((V, W, 64), UNREACHABLE, dtype=dtype)
+    # Ô -1 trỏ tới hàng V, hàng luôn rỗng.
+    nb = np.where(neighbors >= 0, neighbors, V)
+    bit = np.uint64(1) << (np.arange(K) % 64).astype(np.uint64)
+    frontier = np.zeros((V + 1, W), dtype=np.uint64)
+    np.bitwise_or.at(frontier, (sources, np.arange(K) // 64), bit)
+    visited = frontier[:V].copy()
+    dist.reshape(V, W * 64)[sources, np.arange(K)] = 0
+    d = 0
+    while True:
+        d += 1
+        reached = frontier[nb[:, 0]]
+        for k in range(1, nb.shape[1]):
+            reached |= frontier[nb[:, k]]
+        reached &= ~visited
+        cells, words = np.nonzero(reached)
+        if len(cells) == 0:
+            break
+        visited |= reached
+        frontier[:V] = reached
+        # Chỉ các từ khác 0 được giải nén, mỗi từ thành 64 ô của dist.
+        bits = np.unpackbits(reached[cells, words].view(np.uint8).reshape(-1, 8), axis=1,
+                             bitorder='little').view(bool)
+        dist[cells, words] = np.where(bits, dtype(d), dist[cells, words])
+    return np.ascontiguousarray(dist.reshape(V, W * 64)[:, :K].T)
+
+
+class DistanceFieldCache:
+    """
+    Trường khoảng cách BFS tới từng ô đích, tính khi cần và giữ lại theo LRU trong giới hạn bộ nhớ max_bytes.
+    Một trường là mảng int32 [n_rows, n_cols]: số bước ngắn nhất từ mỗi ô tới đích, -1 nếu là vật cản
+    hoặc không tới được. Dùng được làm heuristic chính xác cho A* và để chọn bước đi tiếp theo.
+    """
+
+    def __init__(self, grid, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            grid: Bản đồ, 0 là ô trống; tọa độ tính từ 0.
+            max_bytes: Tổng kích thước tối đa của các trường được giữ lại.
+        """
+        grid = np.asarray(grid)
+        self.n_rows, self.n_cols = grid.shape
+        self.max_bytes = max_bytes
+        self.fields = OrderedDict() # ô đích -> trường khoảng cách, theo thứ tự dùng gần nhất
+        self.hits = 0
+        self.misses = 0
+
+        # Ô kề (chỉ số phẳng) của mỗi ô trống theo 4 hướng, -1 nếu là vật cản hay ngoài bản đồ.
+        # Vật cản không có ô kề, nên đồ thị vô hướng như wavefront_bfs cần.
+        N = self.n_rows * self.n_cols
+        free = grid.reshape(-1) == 0
+        rows, cols = np.divmod(np.arange(N), self.n_cols)
+        self.neighbors = np.full((N, len(MOVES)), -1, dtype=np.int64)
+        for k, (dr, dc) in enumerate(MOVES.values()):
+            r, c = rows + dr, cols + dc
+            inside = (r >= 0) & (r < self.n_rows) & (c >= 0) & (c < self.n_cols)
+            nb = np.where(inside, r * self.n_cols + c, 0)
+            edge = inside & free & free[nb]
+            self.neighbors[edge, k] = nb[edge]
+
+    def compute_field(self, target):
+        """BFS từ ô đích, mỗi lớp được xử lý cùng lúc bằng numpy."""
+        field = np.full(self.n_rows * self.n_cols, UNREACHABLE, dtype=np.int32)
+        source = target[0] * self.n_cols + target[1]
+        field[source] = 0
+        frontier = np.array([source])
+        d = 0
+        while len(frontier):
+            d += 1
+            nxt = self.neighbors[frontier].reshape(-1)
+            nxt = nxt[nxt >= 0]
+            nxt = np.unique(nxt[field[nxt] < 0])
+            field[nxt] = d
+            frontier = nxt
+        return field.reshape(self.n_rows, self.n_cols)
+
+    def field(self, target):
+        """Trường khoảng cách tới target, lấy từ bộ nhớ đệm nếu đã có."""
+        target = (int(target[0]), int(target[1]))
+        field = self.fields.get(target)
+        if field is not None:
+            self.hits += 1
+            self.fields.move_to_end(target)
+            return field
+        self.misses += 1
+        field = self.compute_field(target)
+        self.fields[target] = field
+        # Bỏ các trường dùng lâu nhất khi vượt giới hạn, luôn giữ lại trường vừa tính.
+        while len(self.fields) > 1 and len(self.fields) * field.nbytes > self.max_bytes:
+            self.fields.popitem(last=False)
+        return field
+
+    def prefetch(self, targets):
+        """
+        Tính trước trường khoảng cách của các đích chưa có trong bộ nhớ đệm, tất cả trong một lần wavefront_bfs
+        (ví dụ mọi ô nhận và trả hàng đã biết). Các đích vượt quá giới hạn bộ nhớ bị bỏ như trong field().
+        """
+        missing = list(dict.fromkeys((int(r), int(c)) for r, c in targets if (int(r), int(c)) not in self.fields))
+        if not missing:
+            return
+        fields = wavefront_bfs(self.neighbors, [r * self.n_cols + c for r, c in missing], dtype=np.int32)
+        self.misses += len(missing)
+        for target, field in zip(missing, fields):
+            self.fields[target] = field.reshape(self.n_rows, self.n_cols)
+        while len(self.fields) > 1 and len(self.fields) * fields[0].nbytes > self.max_bytes:
+            self.fields.popitem(last=False)
+
+    def distance(self, start, target):
+        """Số bước ngắn nhất từ start tới target, -1 nếu không tới được."""
+        return int(self.field(target)[start[0], start[1]])
+
+    def next_move(self, start, target, order='UDLR'):
+        """
+        Bước đi đầu tiên của một đường đi ngắn nhất từ start tới target: hướng đầu tiên theo order
+        làm khoảng cách giảm 1. Trả về 'S' nếu start == target, None nếu không tới được.
+        """
+        field = self.field(target)
+        d = field[start[0], start[1]]
+        if d < 0:
+            return None
+        if d == 0:
+            return 'S'
+        for move in order:
+            dr, dc = MOVES[move]
+            r, c = start[0] + dr, start[1] + dc
+            if 0 <= r < self.n_rows and 0 <= c < self.n_cols and field[r, c] == d - 1:
+                return move
+        return None
+
+
+# Bộ nhớ đệm của từng bản đồ, dùng chung giữa các agent và các episode trong một tiến trình.
+_caches = OrderedDict()
+MAX_CACHED_MAPS = 4
+
+
+def get_field_cache(grid, max_bytes=DEFAULT_MAX_BYTES):
+    """DistanceFieldCache dùng chung của bản đồ grid."""
+    array = np.asarray(grid, dtype=np.uint8)
+    key = (array.shape, array.tobytes())
+    cache = _caches.get(key)
+    if cache is None:
+        cache = DistanceFieldCache(array, max_bytes)
+        _caches[key] = cache
+        if len(_caches) > MAX_CACHED_MAPS:
+            _caches.popitem(last=False)
+    else:
+        _caches.move_to_end(key)
+        cache.max_bytes = max_bytes
+    return cache
@@ -0,0 +1,461 @@
+import glob
+import os
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import parent_process, shared_memory
+
+import numpy as np
+
+from distance_fields import wavefront_bfs
+from scenario import map_digest
+
+# Thứ tự hướng đi của BFS trong các agent: khi có nhiều đường đi ngắn nhất, hướng đứng trước được chọn.
+DIRECTIONS = [("U", (-1, 0)), ("L", (0, -1)), ("R", (0, 1)), ("D", (1, 0))]
+# Mã trong bảng first_move -> hướng đi: 0 là đứng yên (cùng ô hoặc không tới được), 1..4 theo DIRECTIONS.
+MOVE_LETTERS = "S" + "".join(move for move, _ in DIRECTIONS)
+UNREACHABLE = -1
+# Thư mục lưu các bảng đã tính trên đĩa, mỗi bản đồ một thư mục con đặt tên theo SHA-256 của nội dung bản đồ.
+CACHE_DIR = "map_cache"
+# Từ số ô trống này trở lên, các bảng được tính song song trên nhiều tiến trình (workers=None).
+PARALLEL_MIN_CELLS = 2048
+# Trên số ô trống này, get_oracle dùng CompressedPathDatabase thay cho các bảng [V, V] đầy đủ.
+DENSE_MAX_CELLS = 20000
+
+
+class DistanceOracle:
+    """
+    Khoảng cách và bước đi đầu tiên của đường đi ngắn nhất giữa mọi cặp ô trống của bản đồ.
+    Các ô trống được đánh số theo thứ tự hàng; dist là ma trận int16 [V, V] (-1 nếu không tới được),
+    first_move là ma trận uint8 [V, V] mã hướng đi đầu tiên và component là nhãn thành phần liên thông.
+    Hướng đầu tiên giống BFS theo thứ tự DIRECTIONS của get_shortest_path cũ: hướng nhỏ nhất d sao cho
+    dist(a + d, b) = dist(a, b) - 1.
+    """
+    TABLES = ('dist', 'first_move', 'component') # Các bảng được lưu trên đĩa bởi save
+    CACHE_SUFFIX = ''
+
+    def __init__(self, grid, origin=0, tables=None, workers=None):
+        """
+        Args:
+            grid: Bản đồ, 0 là ô trống.
+            origin: Tọa độ của hàng / cột đầu tiên trong các ô truyền vào (1 cho state của môi trường).
+            tables: dict các bảng TABLES đã tính sẵn (ví dụ đọc từ đĩa bởi load), None để tính lại.
+            workers: Số tiến trình tính các bảng; None là mọi lõi nếu bản đồ có từ PARALLEL_MIN_CELLS ô trống,
+                ngược lại (hoặc khi đang ở trong một tiến trình con, ví dụ worker của sweep.py) tính trong
+                tiến trình này.
+        """
+        grid = np.asarray(grid)
+        self.n_rows, self.n_cols = grid.shape
+        self.origin = origin
+        self.cells = np.flatnonzero(grid.reshape(-1) == 0) # chỉ số ô trống -> id ô (hàng * n_cols + cột)
+        V = len(self.cells)
+        self.cell_index = {(int(cell) // self.n_cols + origin, int(cell) % self.n_cols + origin): i
+                           for i, cell in enumerate(self.cells.tolist())}
+
+        # Ô kề theo từng hướng, -1 nếu là vật cản hay ngoài bản đồ.
+        index = np.full(self.n_rows * self.n_cols, -1, dtype=np.int64)
+        index[self.cells] = np.arange(V)
+        rows, cols = self.cells // self.n_cols, self.cells % self.n_cols
+        self.neighbors = np.full((V, len(DIRECTIONS)), -1, dtype=np.int64)
+        for k, (_, (dr, dc)) in enumerate(DIRECTIONS):
+            r, c = rows + dr, cols + dc
+            inside = (r >= 0) & (r < self.n_rows) & (c >= 0) & (c < self.n_cols)
+            self.neighbors[inside, k] = index[r[inside] * self.n_cols + c[inside]]
+
+        if tables is not None:
+            for name in self.TABLES:
+                setattr(self, name, tables[name])
+            return
+        if workers is None:
+            workers = os.cpu_count() if V >= PARALLEL_MIN_CELLS and parent_process() is None else 1
+        self.compute_tables(workers)
+
+    def compute_tables(self, workers):
+        """Tính các bảng TABLES."""
+        if workers > 1:
+            self.dist, self.first_move = self.compute_tables_parallel(workers)
+        else:
+            self.dist = self.compute_distances()
+            self.first_move = self.compute_first_moves()
+        # Nhãn thành phần liên thông: chỉ số ô nhỏ nhất tới được.
+        self.component = (self.dist >= 0).argmax(axis=1) if len(self.cells) else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def load(cls, grid, origin=0, cache_dir=CACHE_DIR):
+        """
+        Đọc các bảng của bản đồ từ cache_dir dưới dạng memory-map, None nếu chưa có.
+        Các tiến trình cùng đọc một bản đồ dùng chung một bản trong page cache của hệ điều hành.
+        """
+        directory = cache_path(grid, cache_dir) + cls.CACHE_SUFFIX
+        try:
+            tables = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in cls.TABLES}
+        except (OSError, ValueError):
+            return None
+        oracle = cls(grid, origin, tables)
+        if len(oracle.component) != len(oracle.cells):
+            return None
+        return oracle
+
+    def save(self, grid, cache_dir=CACHE_DIR):
+        """
+        Ghi các bảng vào cache_dir. Mỗi file được ghi ra file tạm rồi đổi tên, nên các tiến trình
+        khác không bao giờ đọc phải một file đang ghi dở.
+        """
+        directory = cache_path(grid, cache_dir) + self.CACHE_SUFFIX
+        os.makedirs(directory, exist_ok=True)
+        for name in self.TABLES:
+            tmp = os.path.join(directory, '%s.%s.tmp.npy' % (name, uuid.uuid4().hex))
+            np.save(tmp, np.ascontiguousarray(getattr(self, name)))
+            os.replace(tmp, os.path.join(directory, name + '.npy'))
+
+    def compute_distances(self, block=4096):
+        """BFS từ mọi ô bằng wavefront_bfs, mỗi lần block nguồn theo thứ tự tile_order."""
+        V = len(self.cells)
+        dist = np.full((V, V), UNREACHABLE, dtype=np.int16)
+        order = tile_order(self.cells, self.n_cols)
+        for start in range(0, V, block):
+            sources = order[start:start + block]
+            dist[sources] = wavefront_bfs(self.neighbors, sources)
+        return dist
+
+    def compute_first_moves(self, block=1024):
+        """Tính bảng first_move từ dist, theo từng khối hàng để giới hạn bộ nhớ tạm."""
+        V = len(self.cells)
+        first_move = np.zeros((V, V), dtype=np.uint8)
+        for start in range(0, V, block):
+            compute_first_move_rows(self.dist, self.neighbors, slice(start, min(start + block, V)), first_move)
+        return first_move
+
+    def compute_tables_parallel(self, workers):
+        """
+        Tính dist rồi first_move trên một nhóm workers tiến trình, mỗi tiến trình một phần các nguồn / hàng.
+        Các tiến trình ghi thẳng vào hai vùng multiprocessing.shared_memory; các bảng trả về là view của
+        hai vùng này nên không phải pickle hay chép lại kết quả.
+        """
+        V = len(self.cells)
+        buffers = [shared_memory.SharedMemory(create=True, size=max(V * V * np.dtype(dtype).itemsize, 1))
+                   for dtype in (np.int16, np.uint8)]
+        try:
+            dist = np.ndarray((V, V), dtype=np.int16, buffer=buffers[0].buf)
+            first_move = np.ndarray((V, V), dtype=np.uint8, buffer=buffers[1].buf)
+            first_move[:] = 0
+            # Mỗi tiến trình nhận vài khối để cân bằng tải; khối nguồn là bội của 64, một từ của bitset.
+            block = max(64, -(-V // (4 * workers)) // 64 * 64)
+            order = tile_order(self.cells, self.n_cols)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_tables,
+                                     initargs=([b.name for b in buffers], V, self.neighbors)) as pool:
+                list(pool.map(_distance_task, [order[i:i + block] for i in range(0, V, block)]))
+                list(pool.map(_first_move_task, [(i, min(i + block, V)) for i in range(0, V, block)]))
+        finally:
+            for b in buffers:
+                # Bỏ tên của vùng nhớ; vùng nhớ được giải phóng cùng với các bảng.
+                b.unlink()
+        weakref.finalize(self, _release, buffers)
+        return dist, first_move
+
+    def index(self, cell):
+        """Chỉ số ô trống của cell, -1 nếu không phải ô trống."""
+        return self.cell_index.get(tuple(cell), -1)
+
+    def index_distance(self, i, j):
+        """Độ dài đường đi ngắn nhất giữa hai chỉ số ô trống cùng thành phần liên thông."""
+        return int(self.dist[i, j])
+
+    def move_code(self, i, j):
+        """Mã hướng đi đầu tiên (theo MOVE_LETTERS) từ ô i tới ô j cùng thành phần liên thông."""
+        return int(self.first_move[i, j])
+
+    def distance(self, a, b):
+        """Độ dài đường đi ngắn nhất từ a tới b, -1 nếu không tới được."""
+        i, j = self.cell_index.get(a, -1), self.cell_index.get(b, -1)
+        if i < 0 or j < 0 or self.component[i] != self.component[j]:
+            return UNREACHABLE
+        return self.index_distance(i, j)
+
+    def connected(self, a, b):
+        """a và b có cùng thành phần liên thông không."""
+        i, j = self.cell_index.get(a, -1), self.cell_index.get(b, -1)
+        return i >= 0 and j >= 0 and self.component[i] == self.component[j]
+
+    def next_move(self, a, b):
+        """Hướng đi đầu tiên từ a tới b ('S' nếu a == b), None nếu không tới được."""
+        i, j = self.cell_index.get(a, -1), self.cell_index.get(b, -1)
+        if i < 0 or j < 0 or self.component[i] != self.component[j]:
+            return None
+        return MOVE_LETTERS[self.move_code(i, j)] if i != j else 'S'
+
+    def path(self, a, b):
+        """Đường đi ngắn nhất từ a tới b dạng LazyPath, None nếu không tới được."""
+        i, j = self.cell_index.get(a, -1), self.cell_index.get(b, -1)
+        if i < 0 or j < 0 or self.component[i] != self.component[j]:
+            return None
+        return LazyPath(self, i, j)
+
+
+class CompressedPathDatabase(DistanceOracle):
+    """
+    Cơ sở dữ liệu đường đi nén cho bản đồ lớn, cùng giao diện với DistanceOracle nhưng không có bảng [V, V].
+    Với mỗi ô đích j, bước đi đầu tiên từ mọi ô được xếp theo thứ tự hàng của các ô xuất phát (các ô liền nhau
+    trên một lối đi thường đi cùng hướng) và nén theo run-length: run_starts là chỉ số ô bắt đầu mỗi đoạn,
+    run_moves là mã hướng của đoạn, các đoạn của đích j nằm trong [row_offsets[j], row_offsets[j + 1]).
+    Khi có nhiều đường đi ngắn nhất, hướng được chọn để đoạn dài nhất, nên có thể khác hướng của DistanceOracle;
+    ô đích và các ô không tới được thuộc đoạn nào cũng được.
+    move_code là một tìm kiếm nhị phân trong các đoạn của đích, O(log số đoạn). Không lưu khoảng cách:
+    index_distance đi theo các bước đầu tiên, O(độ dài * log số đoạn).
+    """
+    TABLES = ('row_offsets', 'run_starts', 'run_moves', 'component')
+    CACHE_SUFFIX = '-compressed'
+
+    def compute_tables(self, workers, block=256):
+        """
+        Tính các đoạn của từng khối block đích bằng wavefront_bfs, các đích lấy theo tile_order;
+        các khối được tính tuần tự (workers bỏ qua).
+        """
+        V = len(self.cells)
+        positions = np.arange(V)
+        order = tile_order(self.cells, self.n_cols)
+        run_targets, run_starts, run_moves = [], [], []
+        for start in range(0, V, block):
+            targets = order[start:start + block]
+            K = len(targets)
+            # dist[t, a] là khoảng cách từ a tới đích t (đồ thị vô hướng).
+            dist = wavefront_bfs(self.neighbors, targets).astype(np.int32)
+            # Hướng k được phép nếu đi tới ô gần đích hơn; ô đích và ô không tới được nhận mọi hướng.
+            anything = dist <= 0
+            next_bad = np.empty((K, len(DIRECTIONS), V), dtype=np.int32)
+            for k in range(len(DIRECTIONS)):
+                nb = self.neighbors[:, k]
+                valid = nb >= 0
+                allowed = anything.copy()
+                allowed[:, valid] |= dist[:, nb[valid]] == dist[:, valid] - 1
+                # Vị trí đầu tiên từ a trở đi mà hướng k không được phép.
+                bad = np.where(allowed, V, positions).astype(np.int32)
+                next_bad[:, k] = np.minimum.accumulate(bad[:, ::-1], axis=1)[:, ::-1]
+            # Tham lam: tại mỗi vị trí chọn hướng được phép xa nhất, rồi nhảy tới hết đoạn của hướng đó.
+            rows = np.arange(K)
+            position = np.zeros(K, dtype=np.int64)
+            while len(rows):
+                ends = next_bad[rows, :, position[rows]]
+                k = ends.argmax(axis=1)
+                run_targets.append(targets[rows])
+                run_starts.append(position[rows].astype(np.int32))
+                run_moves.append((k + 1).astype(np.uint8))
+                position[rows] = ends[np.arange(len(rows)), k]
+                rows = rows[position[rows] < V]
+        # Các đoạn được xếp theo chỉ số đích, trong mỗi đích theo vị trí.
+        run_targets = np.concatenate(run_targets or [np.zeros(0, dtype=np.int64)])
+        by_target = np.argsort(run_targets, kind='stable')
+        self.run_starts = np.concatenate(run_starts or [np.zeros(0, dtype=np.int32)])[by_target]
+        self.run_moves = np.concatenate(run_moves or [np.zeros(0, dtype=np.uint8)])[by_target]
+        self.row_offsets = np.zeros(V + 1, dtype=np.int64)
+        np.cumsum(np.bincount(run_targets, minlength=V), out=self.row_offsets[1:])
+        self.component = connected_components(self.neighbors)
+
+    def move_code(self, i, j):
+        lo, hi = self.row_offsets[j], self.row_offsets[j + 1]
+        k = lo + self.run_starts[lo:hi].searchsorted(i, side='right') - 1
+        return int(self.run_moves[k])
+
+    def index_distance(self, i, j):
+        d = 0
+        while i != j:
+            i = self.neighbors[i, self.move_code(i, j) - 1]
+            d += 1
+        return d
+
+
+def tile_order(cells, n_cols, tile=8):
+    """
+    Thứ tự các ô theo từng khối tile x tile của bản đồ: 64 nguồn cùng một từ bitset của wavefront_bfs ở gần nhau
+    nên tới mỗi ô trong ít lớp BFS.
+    """
+    rows, cols = cells // n_cols, cells % n_cols
+    return np.lexsort((cols, rows, cols // tile, rows // tile))
+
+
+def connected_components(neighbors):
+    """Nhãn thành phần liên thông của từng ô: chỉ số ô nhỏ nhất của thành phần."""
+    V = len(neighbors)
+    component = np.full(V, -1, dtype=np.int64)
+    for source in range(V):
+        if component[source] >= 0:
+            continue
+        component[source] = source
+        frontier = np.array([source])
+        while len(frontier):
+            nxt = neighbors[frontier].reshape(-1)
+            nxt = nxt[nxt >= 0]
+            nxt = np.unique(nxt[component[nxt] < 0])
+            component[nxt] = source
+            frontier = nxt
+    return component
+
+
+def compute_first_move_rows(dist, neighbors, rows, first_move):
+    """Ghi first_move[rows] từ dist; dist đối xứng nên dist(a + d, b) là hàng của ô kề a + d."""
+    block = dist[rows].astype(np.int32)
+    moves = first_move[rows]
+    # Duyệt ngược để hướng đứng trước trong DIRECTIONS được ghi sau cùng.
+    for k in range(len(DIRECTIONS) - 1, -1, -1):
+        nb = neighbors[rows, k]
+        valid = nb >= 0
+        closer = np.zeros(block.shape, dtype=bool)
+        closer[valid] = (dist[nb[valid]] == block[valid] - 1) & (block[valid] > 0)
+        moves[closer] = k + 1
+
+
+# Các bảng dùng chung của một tiến trình con trong compute_tables_parallel.
+_shared = {}
+
+
+def _attach_tables(names, V, neighbors):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    _shared['buffers'] = buffers
+    _shared['dist'] = np.ndarray((V, V), dtype=np.int16, buffer=buffers[0].buf)
+    _shared['first_move'] = np.ndarray((V, V), dtype=np.uint8, buffer=buffers[1].buf)
+    _shared['neighbors'] = neighbors
+
+
+def _distance_task(sources):
+    _shared['dist'][sources] = wavefront_bfs(_shared['neighbors'], sources)
+
+
+def _first_move_task(bounds):
+    compute_first_move_rows(_shared['dist'], _shared['neighbors'], slice(*bounds), _shared['first_move'])
+
+
+def _release(buffers):
+    for b in buffers:
+        try:
+            b.close()
+        except BufferError:
+            pass # Còn view của bảng đang được dùng: vùng nhớ được giải phóng khi view cuối cùng bị hủy.
+
+
+class LazyPath:
+    """
+    Chuỗi hướng đi của một đường đi ngắn nhất, chỉ được sinh khi duyệt.
+    len() và phần tử đầu tiên không cần sinh đường đi (với DistanceOracle); các bước sau theo move_code từ từng ô.
+    """
+    __slots__ = ('oracle', 'source', 'target', 'length')
+
+    def __init__(self, oracle, source, target):
+        self.oracle = oracle
+        self.source = source
+        self.target = target
+        self.length = None
+
+    def __len__(self):
+        if self.length is None:
+            self.length = self.oracle.index_distance(self.source, self.target)
+        return self.length
+
+    def __iter__(self):
+        oracle, neighbors = self.oracle, self.oracle.neighbors
+        i = self.source
+        while i != self.target:
+            code = oracle.move_code(i, self.target)
+            yield MOVE_LETTERS[code]
+            i = neighbors[i, code - 1]
+
+    def __getitem__(self, k):
+        if k == 0 and self.source != self.target:
+            return MOVE_LETTERS[self.oracle.move_code(self.source, self.target)]
+        return str(self)[k]
+
+    def __str__(self):
+        return "".join(self)
+
+    def __repr__(self):
+        return "LazyPath(%r)" % str(self)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def cells(self):
+        """Các chỉ số ô trống đi qua, từ ô đầu tới ô cuối."""
+        oracle, neighbors = self.oracle, self.oracle.neighbors
+        i = self.source
+        yield i
+        while i != self.target:
+            i = int(neighbors[i, oracle.move_code(i, self.target) - 1])
+            yield i
+
+
+# Các oracle đã tính gần đây, dùng lại giữa các episode cùng bản đồ trong một tiến trình.
+_oracles = OrderedDict()
+MAX_CACHED_ORACLES = 4
+
+
+def cache_path(grid, cache_dir=CACHE_DIR):
+    """Thư mục chứa các bảng của bản đồ trong cache_dir."""
+    return os.path.join(cache_dir, map_digest(grid).hex())
+
+
+def get_oracle(grid, origin=0, cache_dir=CACHE_DIR, compressed=None):
+    """
+    DistanceOracle của bản đồ, lấy từ bộ nhớ đệm của tiến trình, rồi từ cache_dir trên đĩa;
+    chỉ được tính lại (và ghi vào cache_dir) khi bản đồ chưa có ở cả hai. cache_dir=None bỏ qua đĩa.
+    compressed: Dùng CompressedPathDatabase; None để chọn theo số ô trống (trên DENSE_MAX_CELLS).
+    """
+    array = np.asarray(grid, dtype=np.uint8)
+    if compressed is None:
+        compressed = np.count_nonzero(array == 0) > DENSE_MAX_CELLS
+    cls = CompressedPathDatabase if compressed else DistanceOracle
+    key = (array.shape, array.tobytes(), origin, cls)
+    oracle = _oracles.get(key)
+    if oracle is None:
+        oracle = cls.load(array, origin, cache_dir) if cache_dir else None
+        if oracle is None:
+            oracle = cls(array, origin)
+            if cache_dir:
+                try:
+                    oracle.save(array, cache_dir)
+                except OSError:
+                    pass # Thư mục không ghi được: vẫn dùng bảng vừa tính.
+        _oracles[key] = oracle
+        if len(_oracles) > MAX_CACHED_ORACLES:
+            _oracles.popitem(last=False)
+    else:
+        _oracles.move_to_end(key)
+    return oracle
+
+
+def load_map(map_file):
+    """Đọc file bản đồ như Environment.load_map."""
+    with open(map_file, 'r') as f:
+        return [[int(x) for x in line.split()] for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Precompute the distance tables of maps into the disk cache")
+    parser.add_argument("maps", type=str, nargs='*', help="Map files, all the map*.txt by default")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR, help="Cache directory")
+    parser.add_argument("--force", action="store_true", help="Recompute the maps that are already cached")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes computing the tables, all the cores for large maps by default")
+    parser.add_argument("--compressed", action="store_true", default=None,
+                        help="Build compressed path databases, by default only for maps above %d free cells"
+                             % DENSE_MAX_CELLS)
+    args = parser.parse_args()
+
+    for map_file in args.maps or sorted(glob.glob("map*.txt")):
+        grid = np.asarray(load_map(map_file), dtype=np.uint8)
+        compressed = args.compressed
+        if compressed is None:
+            compressed = np.count_nonzero(grid == 0) > DENSE_MAX_CELLS
+        cls = CompressedPathDatabase if compressed else DistanceOracle
+        directory = cache_path(grid, args.cache_dir) + cls.CACHE_SUFFIX
+        if not args.force and cls.load(grid, cache_dir=args.cache_dir) is not None:
+            print("%s: cached in %s" % (map_file, directory))
+            continue
+        start = time.perf_counter()
+        oracle = cls(grid, workers=args.workers)
+        oracle.save(grid, args.cache_dir)
+        print("%s: %d cells in %.2fs -> %s" % (map_file, len(oracle.cells), time.perf_counter() - start, directory))
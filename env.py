@@ -1,5 +1,65 @@
+import heapq
 import numpy as np
 
+from scenario import Scenario, map_digest
+
+# Integer codes of the actions, shared by the array-based simulators.
+# A move code indexes MOVES / MOVE_DELTAS, a package code indexes PACKAGE_ACTIONS.
+MOVES = ['S', 'L', 'R', 'U', 'D']
+MOVE_DELTAS = [(0, 0), (0, -1), (0, 1), (-1, 0), (1, 0)]
+PACKAGE_ACTIONS = ['0', '1', '2']
+MOVE_CODES = {move: code for code, move in enumerate(MOVES)}
+PACKAGE_CODES = {act: code for code, act in enumerate(PACKAGE_ACTIONS)}
+
+# Package status codes, indices of the string statuses of Package.
+PACKAGE_STATUSES = ['None', 'waiting', 'in_transit', 'delivered']
+STATUS_NONE = 0
+STATUS_WAITING = 1
+STATUS_IN_TRANSIT = 2
+STATUS_DELIVERED = 3
+
+# Packages returned by Environment.get_observation(), with 0-based cells.
+PACKAGE_DTYPE = np.dtype([('package_id', np.int64), ('start', np.int64, (2,)), ('target', np.int64, (2,)),
+                          ('start_time', np.int64), ('deadline', np.int64)])
+
+class RandintReplay:
+    """
+    Replays RandomState.randint(low, high) on a block of raw 32-bit outputs drawn at once.
+    The legacy RandomState draws a bounded integer by masking raw MT19937 outputs and rejecting the
+    values above the range, so replaying that on the block gives the same integers and, once
+    commit() is called, leaves the RNG exactly where the scalar calls would have.
+    """
+    def __init__(self, rng, size):
+        self.rng = rng
+        self.saved_state = rng.get_state()
+        self.raw = rng.randint(0, 2**32, size=size, dtype=np.uint32).tolist()
+        self.n_used = 0
+
+    def randint(self, low, high):
+        low, high = int(low), int(high)
+        if high <= low:
+            raise ValueError("high <= 0" if low == 0 else "low >= high")
+        span = high - low - 1
+        if span == 0:
+            return low # The RNG is not called for a single value.
+        mask = span
+        for shift in (1, 2, 4, 8, 16):
+            mask |= mask >> shift
+        while True:
+            if self.n_used == len(self.raw):
+                self.raw += self.rng.randint(0, 2**32, size=len(self.raw), dtype=np.uint32).tolist()
+            value = self.raw[self.n_used] & mask
+            self.n_used += 1
+            if value <= span:
+                return low + value
+
+    def commit(self):
+        """
+        Moves the RNG right after the raw outputs actually used.
+        """
+        self.rng.set_state(self.saved_state)
+        self.rng.randint(0, 2**32, size=self.n_used, dtype=np.uint32)
+
 class Robot: 
     def __init__(self, position): 
         self.position = position
@@ -14,22 +74,58 @@ class Package:
         self.package_id = package_id
         self.status = 'None' # Possible statuses: 'waiting', 'in_transit', 'delivered'
 
+class Snapshot:
+    """
+    Mutable state of an Environment at one time step, see Environment.snapshot().
+    The map, the Package objects and the release index are shared with the environment; only the
+    robots, one status byte per package, the waiting queues and the counters are copied. The RNG
+    state is the one of the episode, which steps do not change, so all the snapshots of an episode
+    share it.
+    """
+    __slots__ = ('t', 'total_reward', 'done', 'robots', 'packages', 'release_buckets', 'deadline_buckets',
+                 'release_tables', 'status_codes', 'package_status', 'live_packages', 'waiting_queues',
+                 'n_released', 'n_in_transit', 'n_delivered', 'rng_state', 'source_state')
+
 class Environment: 
 
     def __init__(self, map_file, max_time_steps = 100, n_robots = 5, n_packages=20,
              move_cost=-0.01, delivery_reward=10., delay_reward=1., 
-             seed=2025): 
-        """ Initializes the simulation environment. :param map_file: Path to the map text file. :param move_cost: Cost incurred when a robot moves (LRUD). :param delivery_reward: Reward for delivering a package on time. """ 
+             seed=2025, fast_reset=True, package_source=None, scenario=None): 
+        """ Initializes the simulation environment. :param map_file: Path to the map text file. :param move_cost: Cost incurred when a robot moves (LRUD). :param delivery_reward: Reward for delivering a package on time. :param fast_reset: Replay the RNG draws of reset() on a block of raw outputs instead of one RNG call per draw (same scenarios). :param package_source: Lazy package stream for lifelong episodes (see package_sources.py), replacing the n_packages drawn by reset(). Delivered packages are then forgotten and self.packages stays empty. :param scenario: Scenario whose episodes are loaded by the successive resets instead of being drawn, see from_scenario(). """ 
         self.map_file = map_file
         self.grid = self.load_map()
         self.n_rows = len(self.grid)
         self.n_cols = len(self.grid[0]) if self.grid else 0 
+        # Free cells in row-major order, the table every random cell is drawn from.
+        self.free_cells = [tuple(cell) for cell in np.argwhere(np.array(self.grid) == 0).tolist()]
+        self.fast_reset = fast_reset
+        self.occupancy = [-1] * (self.n_rows * self.n_cols) # cell id -> index of the robot on it, or -1.
         self.move_cost = move_cost 
         self.delivery_reward = delivery_reward 
         self.delay_reward = delay_reward
         self.t = 0 
         self.robots = [] # List of Robot objects.
         self.packages = [] # List of Package objects.
+        self.package_source = package_source
+        self.scenario = scenario
+        self.scenario_episode = 0 # Episode of the scenario loaded by the next reset().
+        if scenario is not None:
+            if package_source is not None:
+                raise ValueError("A scenario already holds the packages, it cannot have a package source.")
+            if scenario.map_digest != map_digest(self.grid):
+                raise ValueError("Scenario " + scenario.path + " was not recorded on map " + map_file + ".")
+            if (scenario.n_robots, scenario.n_packages) != (n_robots, n_packages):
+                raise ValueError("The scenario has %d robots and %d packages." % (scenario.n_robots, scenario.n_packages))
+        self.live_packages = {} # package_id -> released Package not delivered yet.
+        self.release_buckets = {} # start_time -> packages released at that time step.
+        self.deadline_buckets = {} # deadline + 1 -> packages late from that time step.
+        self.waiting_queues = {} # cell -> heap of the package_ids waiting there.
+        self.release_tables = {} # start_time -> PACKAGE_DTYPE array of the packages released then.
+        self.status_codes = bytearray() # package_id - 1 -> status code of the package.
+        self.rng_state = None # RNG state of the current episode, taken by the first snapshot.
+        self.n_released = 0
+        self.n_in_transit = 0
+        self.n_delivered = 0
         self.total_reward = 0
 
         self.n_robots = n_robots
@@ -37,10 +133,33 @@ class Environment:
         self.n_packages = n_packages
 
         self.rng = np.random.RandomState(seed)
+        self.recorder = None # TrajectoryRecorder called after each step, see trajectory.py.
         self.reset()
         self.done = False
         self.state = None
 
+    def reseed(self, seed):
+        """
+        Restarts the RNG as Environment(seed=seed) would and resets, reusing the loaded map.
+        :return: State of the first episode of the seed.
+        """
+        self.rng = np.random.RandomState(seed)
+        self.scenario_episode = 0
+        return self.reset()
+
+    @classmethod
+    def from_scenario(cls, path, map_file, **kwargs):
+        """
+        Creates an environment playing the episodes of a scenario file (see scenario.py) instead of
+        drawing them: the first reset, done here, loads the first episode, the next resets the next ones.
+        :param path: Scenario file, memory-mapped.
+        :param map_file: Map the scenario was recorded on, checked against the map hash of the file.
+        :param kwargs: Other arguments of Environment; max_time_steps defaults to the one of the scenario.
+        """
+        scenario = Scenario(path)
+        kwargs.setdefault('max_time_steps', scenario.max_time_steps)
+        return cls(map_file, n_robots=scenario.n_robots, n_packages=scenario.n_packages, scenario=scenario, **kwargs)
+
     def load_map(self):
         """
         Reads the map file and returns a 2D grid.
@@ -82,46 +201,143 @@ class Environment:
         Resets the environment to its initial state.
         Clears all robots and packages, and reinitializes the grid.
         """
+        if self.recorder is not None:
+            self.recorder.close() # A trajectory covers a single episode.
+
+        # Reinitialize the grid
+        #self.grid = self.load_map(sel)
+        # Add robots and packages
+        # A package source releases its packages itself, only the robots are drawn here.
+        generate = self.generate_scenario if self.package_source is None else self.generate_robots
+        if self.scenario is not None:
+            robot_cells, list_packages = self.scenario.episode(self.scenario_episode)
+            self.scenario_episode += 1
+        elif self.fast_reset:
+            # At most two raw outputs per draw on average, more are drawn if needed.
+            draws = RandintReplay(self.rng, 2 * (self.n_robots + 4 * self.n_packages) + 64)
+            try:
+                robot_cells, list_packages = generate(draws.randint)
+            finally:
+                draws.commit()
+        else:
+            robot_cells, list_packages = generate(self.rng.randint)
+        return self.load_episode(robot_cells, list_packages)
+
+    def load_episode(self, robot_cells, list_packages):
+        """
+        Starts an episode at time step 0 with the given robots and packages, the end of reset().
+        :param robot_cells: Start cell of each robot.
+        :param list_packages: List of (start_time, start, target, deadline), package_ids being given
+            in start_time order.
+        :return: Initial state.
+        """
         self.t = 0
         self.robots = []
         self.packages = []
         self.total_reward = 0
         self.done = False
         self.state = None
-
-        # Reinitialize the grid
-        #self.grid = self.load_map(sel)
-        # Add robots and packages
-        tmp_grid = np.array(self.grid)
-        for i in range(self.n_robots):
-            # Randomly select a free cell for the robot
-            position, tmp_grid = self.get_random_free_cell(tmp_grid)
+        for position in robot_cells:
             self.add_robot(position)
-        
+        if self.package_source is not None:
+            self.package_source.reset(self)
+
+        list_packages.sort(key=lambda x: x[0])
+        for i in range(len(list_packages)):
+            start_time, start, target, deadline = list_packages[i]
+            package_id = i+1
+            self.packages.append(Package(start, start_time, target, deadline, package_id))
+
+        self.build_package_index()
+        self.rng_state = None
+        return self.get_state()
+
+    def generate_scenario(self, randint):
+        """
+        Draws the robot starts and the packages of a new episode.
+        :param randint: Function drawing an integer in [low, high), self.rng.randint or a replay of it.
+        :return: (robot positions, list of (start_time, start, target, deadline) in drawing order).
+        """
+        robot_cells, _ = self.generate_robots(randint)
+
         N = self.n_rows
+        n_cells = len(self.free_cells)
         list_packages = []
         for i in range(self.n_packages):
             # Randomly select a free cell for the package
-            start = self.get_random_free_cell_p()
+            start = self.free_cells[randint(0, n_cells)]
             while True:
-                target = self.get_random_free_cell_p()
+                target = self.free_cells[randint(0, n_cells)]
                 if start != target:
                     break
-            
-            to_deadline = 10 + self.rng.randint(N/2, 3*N)
+
+            to_deadline = 10 + randint(N/2, 3*N)
             if i <= min(self.n_robots, 20):
                 start_time = 0
             else:
-                start_time = self.rng.randint(1, self.max_time_steps)
-            list_packages.append((start_time, start, target, start_time + to_deadline ))
+                start_time = randint(1, self.max_time_steps)
+            list_packages.append((start_time, start, target, start_time + to_deadline))
+        return robot_cells, list_packages
 
-        list_packages.sort(key=lambda x: x[0])
-        for i in range(self.n_packages):
-            start_time, start, target, deadline = list_packages[i]
-            package_id = i+1
-            self.packages.append(Package(start, start_time, target, deadline, package_id))
+    def generate_robots(self, randint):
+        """
+        Draws the robot starts of a new episode, the first draws of generate_scenario().
+        :return: (robot positions, empty list of packages).
+        """
+        # Each robot takes a different free cell.
+        free_cells = list(self.free_cells)
+        return [free_cells.pop(randint(0, len(free_cells))) for _ in range(self.n_robots)], []
 
-        return self.get_state()
+    def build_package_index(self):
+        """
+        Indexes self.packages so that each step only touches the packages that change:
+        release-time buckets, a per-cell queue of waiting packages ordered by package_id,
+        and the in-transit/delivered counters. With a package source, the buckets only hold the
+        released packages that are not delivered yet.
+        """
+        self.release_buckets = {}
+        for package in self.packages:
+            self.release_buckets.setdefault(package.start_time, []).append(package)
+        self.deadline_buckets = {}
+        for package in self.packages:
+            self.deadline_buckets.setdefault(package.deadline + 1, []).append(package)
+        self.waiting_queues = {}
+        self.release_tables = {}
+        self.live_packages = {}
+        # A package source has no fixed number of packages, its status codes are evicted with them.
+        self.status_codes = bytearray(len(self.packages)) if self.package_source is None else {}
+        self.n_released = 0
+        self.n_in_transit = 0
+        self.n_delivered = 0
+        self.release_packages()
+
+    def release_packages(self):
+        """
+        Moves the packages whose start_time is the current time step to the waiting queues.
+        """
+        if self.package_source is not None:
+            self.pull_packages()
+        for package in self.release_buckets.get(self.t, []):
+            self.live_packages[package.package_id] = package
+            self.n_released += 1
+            package.status = 'waiting'
+            self.status_codes[package.package_id - 1] = STATUS_WAITING
+            heapq.heappush(self.waiting_queues.setdefault(package.start, []), package.package_id)
+    
+    def pull_packages(self):
+        """
+        Creates the packages the source releases at the current time step. Only the current
+        release bucket and release table are kept, and the deadline buckets of the past are dropped.
+        """
+        released = []
+        for start, target, deadline in self.package_source.packages_at(self.t):
+            package = Package(start, self.t, target, deadline, self.n_released + len(released) + 1)
+            released.append(package)
+            self.deadline_buckets.setdefault(deadline + 1, []).append(package)
+        self.release_buckets = {self.t: released} if released else {}
+        self.release_tables = {}
+        for t in [t for t in self.deadline_buckets if t < self.t]:
+            del self.deadline_buckets[t]
     
     def get_state(self):
         """
@@ -129,11 +345,7 @@ class Environment:
         The state includes the positions of robots and packages.
         :return: State representation.
         """
-        selected_packages = []
-        for i in range(len(self.packages)):
-            if self.packages[i].start_time == self.t:
-                selected_packages.append(self.packages[i])
-                self.packages[i].status = 'waiting'
+        selected_packages = self.release_buckets.get(self.t, [])
 
         state = {
             'time_step': self.t,
@@ -144,6 +356,32 @@ class Environment:
                           package.target[0] + 1, package.target[1] + 1, package.start_time, package.deadline) for package in selected_packages]
         }
         return state
+
+    def get_observation(self):
+        """
+        Returns the current state as arrays, with 0-based cells and without the map.
+        :return: dict with 'time_step', 'robots' (int array [n_robots, 2] of positions), 'carrying'
+            (int array [n_robots] of carried package_ids, 0 if none) and 'packages' (read-only
+            PACKAGE_DTYPE array of the packages released at this time step).
+        """
+        return {
+            'time_step': self.t,
+            'robots': np.array([robot.position for robot in self.robots], dtype=np.int64).reshape(-1, 2),
+            'carrying': np.array([robot.carrying for robot in self.robots], dtype=np.int64),
+            'packages': self.release_table(self.t),
+        }
+
+    def release_table(self, t):
+        """
+        Returns the packages released at time step t as a PACKAGE_DTYPE array, built once per time step.
+        """
+        table = self.release_tables.get(t)
+        if table is None:
+            table = np.array([(p.package_id, p.start, p.target, p.start_time, p.deadline)
+                              for p in self.release_buckets.get(t, [])], dtype=PACKAGE_DTYPE)
+            table.setflags(write=False)
+            self.release_tables[t] = table
+        return table
         
 
     def get_random_free_cell_p(self):
@@ -151,10 +389,8 @@ class Environment:
         Returns a random free cell in the grid.
         :return: Tuple (row, col) of a free cell.
         """
-        free_cells = [(i, j) for i in range(self.n_rows) for j in range(self.n_cols) \
-                      if self.grid[i][j] == 0]
-        i = self.rng.randint(0, len(free_cells))
-        return free_cells[i]
+        i = self.rng.randint(0, len(self.free_cells))
+        return self.free_cells[i]
 
 
     def get_random_free_cell(self, new_grid):
@@ -162,8 +398,7 @@ class Environment:
         Returns a random free cell in the grid.
         :return: Tuple (row, col) of a free cell.
         """
-        free_cells = [(i, j) for i in range(self.n_rows) for j in range(self.n_cols) \
-                      if new_grid[i][j] == 0]
+        free_cells = [tuple(cell) for cell in np.argwhere(np.asarray(new_grid) == 0).tolist()]
         i = self.rng.randint(0, len(free_cells))
         new_grid[free_cells[i][0]][free_cells[i][1]] = 1
         return free_cells[i], new_grid
@@ -177,111 +412,169 @@ class Environment:
             package_action: '1' (pickup), '2' (drop), or '0' (do nothing).
         :return: The updated state and total accumulated reward.
         """
-        r = 0
         if len(actions) != len(self.robots):
             raise ValueError("The number of actions must match the number of robots.")
+        moves = [MOVE_CODES.get(move, 0) for move, pkg_act in actions]
+        pkg_acts = [PACKAGE_CODES.get(pkg_act, 0) for move, pkg_act in actions]
+        r, done, infos = self.advance(moves, pkg_acts)
+        return self.get_state(), r, done, infos
 
-        #print("Package env: ")
-        #print([p.status for p in self.packages])
+    def step_array(self, actions):
+        """
+        Array version of step(), without string actions nor dict states.
+        :param actions: Integer array [n_robots, 2] of (move code, package code), indices of MOVES and
+            PACKAGE_ACTIONS.
+        :return: (observation, reward, done, infos), see get_observation().
+        """
+        actions = np.asarray(actions)
+        if len(actions) != len(self.robots):
+            raise ValueError("The number of actions must match the number of robots.")
+        r, done, infos = self.advance(actions[:, 0].tolist(), actions[:, 1].tolist())
+        return self.get_observation(), r, done, infos
+
+    def step_macro(self, plans, max_steps=None):
+        """
+        Event-driven version of step(): each robot follows a whole path and the simulation runs until
+        something needs a decision. The events are:
+            'arrival': a robot has done its last move and its package action,
+            'blocked': a robot did not reach the next cell of its path,
+            'release': new packages are released (they are in the returned state),
+            'deadline': a waiting or carried package becomes late.
+        When no robot has anything to do, the idle time steps are skipped at once up to the next
+        release, deadline or the end of the episode.
+        :param plans: One (moves, package_action) per robot, moves being a sequence of move actions
+            ('S', 'L', 'R', 'U', 'D') and package_action ('0', '1' or '2') being done with the last
+            move, or at the first time step if moves is empty. ('', '0') leaves the robot idle.
+        :param max_steps: Maximum number of time steps to run, unlimited if None.
+        :return: (state, reward, done, infos) as step(), reward being summed over the time steps run.
+            infos also holds 'n_steps' and 'events', a list of (time_step, event, robot index or package_id).
+        """
+        if len(plans) != len(self.robots):
+            raise ValueError("The number of plans must match the number of robots.")
+        paths = [[MOVE_CODES.get(move, 0) for move in moves] for moves, pkg_act in plans]
+        finals = [PACKAGE_CODES.get(pkg_act, 0) for moves, pkg_act in plans]
+        active = [i for i in range(len(plans)) if paths[i] or finals[i]]
+        start = self.t
+        end = self.max_time_steps if max_steps is None else min(self.max_time_steps, self.t + max_steps)
+        reward = 0
+        events = []
+        done = self.check_terminate()
+        infos = {}
+
+        if not active and not done and self.t < end:
+            # Standing still earns nothing, so the idle steps are skipped up to the next event.
+            if self.package_source is None:
+                later = [t for t in self.release_buckets if t > self.t]
+            else:
+                later = [t for t in [self.package_source.next_release(self.t, end)] if t is not None]
+            later += [t for t, packages in self.deadline_buckets.items() if t > self.t
+                      and any(package.status in ('waiting', 'in_transit') for package in packages)]
+            self.t = min(later + [end])
+            self.release_packages()
+            if self.recorder is not None:
+                self.recorder.skip()
+            self.record_events(events)
+            done = self.check_terminate()
+            if done:
+                infos = {'total_reward': self.total_reward, 'total_time_steps': self.t}
+
+        k = 0
+        while active and not done and self.t < end:
+            moves = [path[k] if k < len(path) else 0 for path in paths]
+            pkg_acts = [final if k == max(len(path) - 1, 0) else 0 for path, final in zip(paths, finals)]
+            expected = []
+            for robot, move in zip(self.robots, moves):
+                dr, dc = MOVE_DELTAS[move]
+                expected.append((robot.position[0] + dr, robot.position[1] + dc))
+            r, done, infos = self.advance(moves, pkg_acts)
+            reward += r
+            for i in active:
+                if k < len(paths[i]) and self.robots[i].position != expected[i]:
+                    events.append((self.t, 'blocked', i))
+                elif k == max(len(paths[i]) - 1, 0):
+                    events.append((self.t, 'arrival', i))
+            self.record_events(events)
+            k += 1
+            active = [i for i in active if k < len(paths[i])]
+            if events:
+                break
+
+        infos = dict(infos)
+        infos['n_steps'] = self.t - start
+        infos['events'] = events
+        return self.get_state(), reward, done, infos
+
+    def record_events(self, events):
+        """
+        Appends the release and deadline events of the current time step to events.
+        """
+        for package in self.release_buckets.get(self.t, []):
+            events.append((self.t, 'release', package.package_id))
+        for package in self.deadline_buckets.get(self.t, []):
+            if package.status in ('waiting', 'in_transit'):
+                events.append((self.t, 'deadline', package.package_id))
+
+    def advance(self, moves, pkg_acts):
+        """
+        Applies one timestep of integer-coded actions, shared by step() and step_array().
+        :param moves: Move code of each robot, an index of MOVES (other values stay).
+        :param pkg_acts: Package code of each robot, an index of PACKAGE_ACTIONS.
+        :return: (reward, done, infos).
+        """
+        r = 0
 
         # -------- Process Movement --------
         proposed_positions = []
         # For each robot, compute the new position based on the movement action.
-        old_pos = {}
-        next_pos = {}
-        for i, robot in enumerate(self.robots):
-            move, pkg_act = actions[i]
-            new_pos = self.compute_new_position(robot.position, move)
-            # Check if the new position is valid (inside bounds and not an obstacle).
-            if not self.valid_position(new_pos):
-                new_pos = robot.position  # Invalid moves result in no change.
+        for robot, move in zip(self.robots, moves):
+            new_pos = robot.position
+            if 0 < move < len(MOVES):
+                dr, dc = MOVE_DELTAS[move]
+                new_pos = (new_pos[0] + dr, new_pos[1] + dc)
+                # Check if the new position is valid (inside bounds and not an obstacle).
+                if not self.valid_position(new_pos):
+                    new_pos = robot.position  # Invalid moves result in no change.
             proposed_positions.append(new_pos)
-            old_pos[robot.position] = i
-            next_pos[new_pos] = i
 
-        moved_robots = [0 for _ in range(len(self.robots))]
-        computed_moved = [0 for _ in range(len(self.robots))]
-        final_positions = [None] * len(self.robots)
-        occupied = {}  # Dictionary to record occupied cells.
-        while True:
-            updated = False
-            for i in range(len(self.robots)):
-            
-                if computed_moved[i] != 0: 
-                    continue
-
-                pos = self.robots[i].position
-                new_pos = proposed_positions[i]
-                can_move = False
-                if new_pos not in old_pos:
-                    can_move = True
-                else:
-                    j = old_pos[new_pos]
-                    if (j != i) and (computed_moved[j] == 0): # We must wait for the conflict resolve
-                        continue
-                    # We can decide where the robot can go now
-                    can_move = True
-
-                if can_move:
-                    # print("Updated: ", i, new_pos)
-                    if new_pos not in occupied:
-                        occupied[new_pos] = i
-                        final_positions[i] = new_pos
-                        computed_moved[i] = 1
-                        moved_robots[i] = 1
-                        updated = True
-                    else:
-                        new_pos = pos
-                        occupied[new_pos] = i
-                        final_positions[i] = pos
-                        computed_moved[i] = 1
-                        moved_robots[i] = 0
-                        updated = True
-
-                if updated:
-                    break
-
-            if not updated:
-                break
-        #print("Computed postions: ", final_positions)
-        for i in range(len(self.robots)):
-            if computed_moved[i] == 0:
-                final_positions[i] = self.robots[i].position 
+        final_positions = self.resolve_moves(proposed_positions)
         
         # Update robot positions and apply movement cost when applicable.
         for i, robot in enumerate(self.robots):
-            move, pkg_act = actions[i]
-            if move in ['L', 'R', 'U', 'D'] and final_positions[i] != robot.position:
+            if final_positions[i] != robot.position:
                 r += self.move_cost
             robot.position = final_positions[i]
 
         # -------- Process Package Actions --------
-        for i, robot in enumerate(self.robots):
-            move, pkg_act = actions[i]
-            #print(i, move, pkg_act)
+        for robot, pkg_act in zip(self.robots, pkg_acts):
             # Pick up action.
-            if pkg_act == '1':
-                if robot.carrying == 0:
-                    # Check for available packages at the current cell.
-                    for j in range(len(self.packages)):
-                        if self.packages[j].status == 'waiting' and self.packages[j].start == robot.position and self.packages[j].start_time <= self.t:
-                            # Pick the package with the smallest package_id.
-                            package_id = self.packages[j].package_id
-                            robot.carrying = package_id
-                            self.packages[j].status = 'in_transit'
-                            # print(package_id, 'in transit')
-                            break
+            if pkg_act == 1:
+                queue = self.waiting_queues.get(robot.position)
+                if robot.carrying == 0 and queue:
+                    # Pick the package with the smallest package_id waiting at the current cell.
+                    package_id = heapq.heappop(queue)
+                    if not queue:
+                        del self.waiting_queues[robot.position]
+                    robot.carrying = package_id
+                    self.live_packages[package_id].status = 'in_transit'
+                    self.status_codes[package_id - 1] = STATUS_IN_TRANSIT
+                    self.n_in_transit += 1
 
             # Drop action.
-            elif pkg_act == '2':
+            elif pkg_act == 2:
                 if robot.carrying != 0:
                     package_id = robot.carrying
-                    target = self.packages[package_id - 1].target
+                    target = self.live_packages[package_id].target
                     # Check if the robot is at the target position.
                     if robot.position == target:
                         # Update package status to delivered.
-                        pkg = self.packages[package_id - 1]
+                        pkg = self.live_packages.pop(package_id)
                         pkg.status = 'delivered'
+                        if self.package_source is None:
+                            self.status_codes[package_id - 1] = STATUS_DELIVERED
+                        else:
+                            del self.status_codes[package_id - 1]
+                        self.n_in_transit -= 1
+                        self.n_delivered += 1
                         # Apply reward based on whether the delivery is on time.
                         if self.t <= pkg.deadline:
                             r += self.delivery_reward
@@ -292,6 +585,7 @@ class Environment:
         
         # Increment the simulation timestep.
         self.t += 1
+        self.release_packages()
 
         self.total_reward += r
 
@@ -302,17 +596,176 @@ class Environment:
             infos['total_reward'] = self.total_reward
             infos['total_time_steps'] = self.t
 
-        return self.get_state(), r, done, infos
+        if self.recorder is not None:
+            self.recorder.record(moves, pkg_acts, r)
+        return r, done, infos
     
+    def resolve_moves(self, proposed_positions):
+        """
+        Resolves the conflicts between the proposed moves of the robots.
+        The moves form a functional graph over the occupancy array: a robot moving into the cell of
+        another robot waits until that robot is resolved, a cell goes to the lowest robot index asking
+        for it and a robot that cannot get its cell keeps its own. Robots on a cycle, or waiting
+        behind one, do not move. Each robot and each target cell is handled once.
+        :param proposed_positions: Valid new position of each robot.
+        :return: Final position of each robot.
+        """
+        n_cols = self.n_cols
+        occupancy = self.occupancy
+        current = [r * n_cols + c for r, c in (robot.position for robot in self.robots)]
+        target = [r * n_cols + c for r, c in proposed_positions]
+        for i, cell in enumerate(current):
+            occupancy[cell] = i
+
+        # Robots asking for each cell, by increasing index.
+        contenders = {}
+        for i, cell in enumerate(target):
+            contenders.setdefault(cell, []).append(i)
+
+        # A cell can be decided once the robot standing on it, if any, is resolved.
+        ready = [cell for cell in contenders
+                 if occupancy[cell] < 0 or target[occupancy[cell]] == cell]
+        final = list(current)
+        claimed = set()
+        while ready:
+            cell = ready.pop()
+            owner = occupancy[cell]
+            if owner >= 0 and target[owner] == cell:
+                winner = owner # The robot staying on its cell keeps it.
+            elif cell in claimed:
+                winner = -1
+            else:
+                winner = contenders[cell][0]
+            for i in contenders[cell]:
+                if i == winner:
+                    final[i] = cell
+                    claimed.add(cell)
+                else:
+                    claimed.add(current[i])
+                # Robot i is resolved, so the cell it stands on can be decided.
+                if i != owner and current[i] in contenders:
+                    ready.append(current[i])
+
+        for cell in current:
+            occupancy[cell] = -1
+        return [proposed_positions[i] if final[i] == target[i] else robot.position
+                for i, robot in enumerate(self.robots)]
+
+    def snapshot(self):
+        """
+        Captures the state of the episode so that restore() can come back to it, e.g. to try several
+        actions from the same state. Costs a copy of the robots, of one byte per package and of the
+        waiting queues; the map and the packages are shared.
+        Only valid while the RNG is used by reset() alone.
+        :return: Snapshot object.
+        """
+        if self.rng_state is None:
+            self.rng_state = self.rng.get_state()
+        snap = Snapshot()
+        snap.t = self.t
+        snap.total_reward = self.total_reward
+        snap.done = self.done
+        snap.robots = tuple((robot.position, robot.carrying) for robot in self.robots)
+        snap.packages = self.packages
+        snap.release_buckets = self.release_buckets
+        snap.deadline_buckets = self.deadline_buckets
+        if self.package_source is not None:
+            # These change in place with a package source.
+            snap.deadline_buckets = {t: list(packages) for t, packages in self.deadline_buckets.items()}
+        snap.release_tables = self.release_tables
+        snap.status_codes = self.status_codes
+        snap.package_status = bytes(self.status_codes) if self.package_source is None else dict(self.status_codes)
+        snap.live_packages = dict(self.live_packages)
+        snap.waiting_queues = tuple((cell, tuple(queue)) for cell, queue in self.waiting_queues.items())
+        snap.n_released = self.n_released
+        snap.n_in_transit = self.n_in_transit
+        snap.n_delivered = self.n_delivered
+        snap.rng_state = self.rng_state
+        snap.source_state = None if self.package_source is None else self.package_source.get_state()
+        return snap
+
+    def restore(self, snap):
+        """
+        Brings the environment back to a state captured by snapshot(), possibly of an earlier episode.
+        Only the Package objects whose status differs from the snapshot are updated.
+        :param snap: Snapshot returned by snapshot().
+        """
+        if len(snap.robots) != len(self.robots):
+            raise ValueError("The snapshot does not match the number of robots.")
+        self.t = snap.t
+        self.total_reward = snap.total_reward
+        self.done = snap.done
+        for robot, (position, carrying) in zip(self.robots, snap.robots):
+            robot.position = position
+            robot.carrying = carrying
+
+        # The status codes of an episode live as long as its packages, restore the changed ones.
+        self.packages = snap.packages
+        self.release_buckets = snap.release_buckets
+        self.deadline_buckets = snap.deadline_buckets
+        self.release_tables = snap.release_tables
+        self.live_packages = dict(snap.live_packages)
+        if self.package_source is None:
+            self.status_codes = snap.status_codes
+            current = np.frombuffer(self.status_codes, dtype=np.uint8)
+            saved = np.frombuffer(snap.package_status, dtype=np.uint8)
+            for j in np.flatnonzero(current != saved).tolist():
+                self.packages[j].status = PACKAGE_STATUSES[saved[j]]
+            self.status_codes[:] = snap.package_status
+        else:
+            # Only the live packages of the snapshot are still referenced.
+            self.deadline_buckets = {t: list(packages) for t, packages in snap.deadline_buckets.items()}
+            self.status_codes = dict(snap.package_status)
+            for package_id, package in self.live_packages.items():
+                package.status = PACKAGE_STATUSES[self.status_codes[package_id - 1]]
+            self.package_source.set_state(snap.source_state)
+
+        self.waiting_queues = {cell: list(queue) for cell, queue in snap.waiting_queues}
+        self.n_released = snap.n_released
+        self.n_in_transit = snap.n_in_transit
+        self.n_delivered = snap.n_delivered
+        if snap.rng_state is not self.rng_state:
+            self.rng.set_state(snap.rng_state)
+            self.rng_state = snap.rng_state
+
+    def load_state(self, t, total_reward, positions, carrying, status_codes):
+        """
+        Sets the state of the current episode from its plain values, as kept by the trajectory
+        keyframes; the waiting queues and the counters are rebuilt from the package statuses.
+        :param positions: Position of each robot.
+        :param carrying: package_id carried by each robot, 0 if none.
+        :param status_codes: Status code of each package, see PACKAGE_STATUSES.
+        """
+        if self.package_source is not None:
+            raise ValueError("The state of an episode with a package source cannot be loaded.")
+        self.t = t
+        self.total_reward = total_reward
+        for robot, position, package_id in zip(self.robots, positions, carrying):
+            robot.position = tuple(position)
+            robot.carrying = package_id
+        self.status_codes = bytearray(status_codes)
+        self.waiting_queues = {}
+        self.live_packages = {}
+        self.n_released = self.n_in_transit = self.n_delivered = 0
+        for package, code in zip(self.packages, self.status_codes):
+            package.status = PACKAGE_STATUSES[code]
+            if code != STATUS_NONE:
+                self.n_released += 1
+            if code == STATUS_WAITING:
+                self.live_packages[package.package_id] = package
+                heapq.heappush(self.waiting_queues.setdefault(package.start, []), package.package_id)
+            elif code == STATUS_IN_TRANSIT:
+                self.live_packages[package.package_id] = package
+                self.n_in_transit += 1
+            elif code == STATUS_DELIVERED:
+                self.n_delivered += 1
+
     def check_terminate(self):
         if self.t == self.max_time_steps:
             return True
-        
-        for p in self.packages:
-            if p.status != 'delivered':
-                return False
-            
-        return True
+        if self.package_source is not None:
+            return not self.live_packages and self.package_source.exhausted(self.t)
+        return self.n_delivered == len(self.packages)
 
     def compute_new_position(self, position, move):
         """
@@ -1,53 +1,30 @@
 import json
 import os
-from collections import deque
 
+from distance_oracle import DistanceOracle, load_map
 
-def find_path(path):
-    matrix = []
-    with open(path, 'r') as input_file:
-        for line in input_file:
-            row = list(map(int, line.strip().split()))
-            matrix.append(row)
 
-    map_position = []
-    n, m = len(matrix), len(matrix[0])
-    directions = [("U", (-1, 0)), ("L", (0, -1)), ("R", (0, 1)), ("D", (1, 0))]
-
-    for i in range(n):
-        for j in range(m):
-            if matrix[i][j] == 0:
-                map_position.append((i+1, j+1))
+def find_path(path, workers=None):
+    # Các bảng khoảng cách / bước đi đầu tiên được tính song song trên nhiều tiến trình với bản đồ lớn,
+    # xem DistanceOracle.compute_tables_parallel.
+    oracle = DistanceOracle(load_map(path), origin=1, workers=workers)
+    map_position = list(oracle.cell_index)
 
     out_path = "map_path/" + path
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, 'w') as out_file:
         for i in range(len(map_position)):
-            dist = [[-1] * m for _ in range(n)]
-            str_path = [[""] * m for _ in range(n)]
-            queue = deque()
-
-            start_i, start_j = map_position[i]
-            queue.append((start_i, start_j))
-            dist[start_i][start_j] = 0
-            str_path[start_i][start_j] = ""
-
-            while queue:
-                x, y = queue.popleft()
-
-                for (direc_move, (di, dj)) in directions:
-                    pos_i = x + di
-                    pos_j = y + dj
-                    if 0 < pos_i < n and 0 < pos_j < m and dist[pos_i][pos_j] == -1 and matrix[pos_i][pos_j] == 0:
-                        dist[pos_i][pos_j] = dist[x][y] + 1
-                        str_path[pos_i][pos_j] = str_path[x][y] + direc_move
-                        queue.append((pos_i, pos_j))
-                        path_answer = {
-                            "start": (start_i, start_j),
-                            "target": (pos_i, pos_j),
-                            "path": str_path[pos_i][pos_j]
-                        }
-                        out_file.write(json.dumps(path_answer) + '\n')
+            dist = oracle.dist[i]
+            # Các ô tới được theo thứ tự BFS: khoảng cách tăng dần.
+            targets = [j for j in dist.argsort(kind='stable').tolist() if dist[j] > 0]
+            for j in targets:
+                path_answer = {
+                    "start": map_position[i],
+                    "target": map_position[j],
+                    "path": str(oracle.path(map_position[i], map_position[j]))
+                }
+                out_file.write(json.dumps(path_answer) + '\n')
 
 if __name__ == "__main__":
     path = "map.txt"
-    find_path(path)
\ No newline at end of file
+    find_path(path)
@@ -1,41 +1,7 @@
 import random
-def run_bfs(map, start, goal):
-    n_rows = len(map)
-    n_cols = len(map[0])
-
-    queue = []
-    visited = set()
-    queue.append((goal, []))
-    visited.add(goal)
-    d = {}
-    d[goal] = 0
-
-    while queue:
-        current, path = queue.pop(0)
-
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            next_pos = (current[0] + dx, current[1] + dy)
-            if next_pos[0] < 0 or next_pos[0] >= n_rows or next_pos[1] < 0 or next_pos[1] >= n_cols:
-                continue
-            if next_pos not in visited and map[next_pos[0]][next_pos[1]] == 0:
-                visited.add(next_pos)
-                d[next_pos] = d[current] + 1
-                queue.append((next_pos, path + [next_pos]))
-
-    if start not in d:
-        return 'S', 100000
-
-    t = 0
-    actions = ['U', 'D', 'L', 'R']
-    current = start
-    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-        next_pos = (current[0] + dx, current[1] + dy)
-        if next_pos in d:
-            if d[next_pos] == d[current] - 1:
-                return actions[t], d[next_pos]
-        t += 1
-    return 'S', d[start]
 
+from distance_fields import get_field_cache
+from greedyagent import run_bfs
 
 class GreedyAgentsOptimal:
     def __init__(self):
@@ -51,6 +17,7 @@ class GreedyAgentsOptimal:
         self.state = state
         self.n_robots = len(state['robots'])
         self.map = state['map']
+        self.fields = get_field_cache(self.map)
         self.robots = [(robot[0] - 1, robot[1] - 1, 0) for robot in state['robots']]
         self.robots_target = ['free'] * self.n_robots
         self.packages += [(p[0], p[1] - 1, p[2] - 1, p[3] - 1, p[4] - 1, p[5]) for p in state['packages']]
@@ -78,7 +45,7 @@ class GreedyAgentsOptimal:
             target_p = (pkg[1], pkg[2])
             if phase == 'target':
                 target_p = (pkg[3], pkg[4])
-            move, distance = run_bfs(self.map, (self.robots[i][0], self.robots[i][1]), target_p)
+            move, distance = run_bfs(self.map, (self.robots[i][0], self.robots[i][1]), target_p, self.fields)
 
             if distance == 0:
                 if phase == 'start':
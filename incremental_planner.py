@@ -0,0 +1,117 @@
+import heapq
+
+INF = float('inf')
+
+
+class DStarLite:
+    """
+    D* Lite (Koenig & Likhachev) trên lưới 4 hướng, tìm ngược từ đích về vị trí hiện tại của robot.
+    Khi một số ô bị chặn tạm thời (ví dụ bởi robot khác) hoặc được giải phóng, chỉ các ô có khoảng cách bị
+    ảnh hưởng được tính lại, thay vì tìm lại từ đầu. Ô được đánh số phẳng (hàng * n_cols + cột) như trong
+    AStarBase.a_star_search; g và rhs chỉ lưu cho các ô đã chạm tới.
+    """
+
+    def __init__(self, cell_neighbors, n_cols, goal):
+        """
+        Args:
+            cell_neighbors: Danh sách chỉ số các ô trống kề (4 hướng) của mỗi ô.
+            n_cols: Số cột của bản đồ.
+            goal: Chỉ số ô đích.
+        """
+        self.cell_neighbors = cell_neighbors
+        self.n_cols = n_cols
+        self.goal = goal
+        self.start = None
+        self.last_start = None
+        self.km = 0
+        self.g = {}
+        self.rhs = {goal: 0}
+        self.blocked = set()
+        self.open_keys = {goal: (0, 0)}  # ô trong hàng đợi -> khóa hiện tại
+        self.open_set = [((0, 0), goal)]
+        self.expansions = 0
+
+    def heuristic(self, a, b):
+        ra, ca = divmod(a, self.n_cols)
+        rb, cb = divmod(b, self.n_cols)
+        return abs(ra - rb) + abs(ca - cb)
+
+    def calculate_key(self, cell):
+        best = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return (best + self.heuristic(self.start, cell) + self.km, best)
+
+    def update_vertex(self, cell):
+        if cell != self.goal:
+            if cell in self.blocked:
+                rhs = INF
+            else:
+                rhs = min((1 + self.g.get(nb, INF) for nb in self.cell_neighbors[cell] if nb not in self.blocked),
+                          default=INF)
+            self.rhs[cell] = rhs
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            key = self.calculate_key(cell)
+            self.open_keys[cell] = key
+            heapq.heappush(self.open_set, (key, cell))
+        else:
+            self.open_keys.pop(cell, None)
+
+    def top_key(self):
+        """Khóa nhỏ nhất trong hàng đợi, bỏ các phần tử đã cũ."""
+        while self.open_set:
+            key, cell = self.open_set[0]
+            if self.open_keys.get(cell) == key:
+                return key
+            heapq.heappop(self.open_set)
+        return (INF, INF)
+
+    def compute_shortest_path(self):
+        while (self.top_key() < self.calculate_key(self.start) or
+               self.rhs.get(self.start, INF) != self.g.get(self.start, INF)):
+            if not self.open_set:
+                break
+            key_old, cell = heapq.heappop(self.open_set)
+            self.expansions += 1
+            key_new = self.calculate_key(cell)
+            g, rhs = self.g.get(cell, INF), self.rhs.get(cell, INF)
+            if key_old < key_new:
+                self.open_keys[cell] = key_new
+                heapq.heappush(self.open_set, (key_new, cell))
+            elif g > rhs:
+                self.g[cell] = rhs
+                del self.open_keys[cell]
+                for nb in self.cell_neighbors[cell]:
+                    self.update_vertex(nb)
+            else:
+                self.g[cell] = INF
+                self.update_vertex(cell)
+                for nb in self.cell_neighbors[cell]:
+                    self.update_vertex(nb)
+
+    def set_blocked(self, blocked):
+        """Cập nhật tập ô bị chặn; chỉ các ô đổi trạng thái và các ô kề của chúng được cập nhật."""
+        blocked = set(blocked)
+        changed = blocked ^ self.blocked
+        self.blocked = blocked
+        if self.start is not None and changed:
+            for cell in changed:
+                self.update_vertex(cell)
+                for nb in self.cell_neighbors[cell]:
+                    self.update_vertex(nb)
+
+    def move_start(self, start):
+        """Robot đã tới ô start: cộng dồn km thay vì sắp xếp lại hàng đợi."""
+        if self.last_start is not None:
+            self.km += self.heuristic(self.last_start, start)
+        self.start = self.last_start = start
+
+    def distance(self):
+        """Số bước ngắn nhất từ vị trí hiện tại tới đích tránh các ô bị chặn, INF nếu không có đường."""
+        self.compute_shortest_path()
+        return self.g.get(self.start, INF) if self.start != self.goal else 0
+
+    def next_cell(self):
+        """Ô tiếp theo trên đường ngắn nhất, None nếu không có đường hoặc đã ở đích."""
+        if self.start == self.goal or self.distance() == INF:
+            return None
+        return min((nb for nb in self.cell_neighbors[self.start] if nb not in self.blocked),
+                   key=lambda nb: self.g.get(nb, INF), default=None)
@@ -0,0 +1,177 @@
+import heapq
+from collections import OrderedDict
+
+import numpy as np
+
+# Các hướng đi theo tọa độ (hàng, cột), cùng thứ tự với distance_oracle.DIRECTIONS.
+DIRECTIONS = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+
+
+class JunctionGraph:
+    """
+    Đồ thị nút giao của bản đồ: các chuỗi ô hành lang (ô trống có đúng 2 ô trống kề) được rút gọn thành một cạnh
+    có trọng số giữa hai nút giao (các ô trống còn lại). Tọa độ tính từ 0 như trong AStarBase.
+
+    - junctions: danh sách ô nút giao, junction_index: ô -> chỉ số nút giao.
+    - edges: danh sách (u, v, cells): cạnh giữa nút u và v, cells là các ô hành lang theo thứ tự từ u tới v;
+      độ dài cạnh là len(cells) + 1.
+    - cell_edge: ô hành lang -> (chỉ số cạnh, offset), offset là số bước từ u (1..len(cells)).
+    - adjacency: nút -> danh sách (cạnh, nút kia, độ dài, đi từ u hay không).
+    Một vòng hành lang không có nút giao nào được cắt tại ô đầu tiên của nó, ô này thành nút giao.
+    """
+
+    def __init__(self, grid):
+        grid = np.asarray(grid)
+        self.n_rows, self.n_cols = grid.shape
+        free = {(int(r), int(c)) for r, c in np.argwhere(grid == 0)}
+        self.neighbors = {cell: [(cell[0] + dr, cell[1] + dc) for dr, dc in DIRECTIONS
+                                 if (cell[0] + dr, cell[1] + dc) in free] for cell in sorted(free)}
+
+        self.junctions = [cell for cell, nbs in self.neighbors.items() if len(nbs) != 2]
+        self.junction_index = {cell: i for i, cell in enumerate(self.junctions)}
+        self.edges = []
+        self.cell_edge = {}
+        self.adjacency = [[] for _ in self.junctions]
+        for u in range(len(self.junctions)):
+            self.add_edges_from(u)
+        # Các vòng hành lang còn lại.
+        for cell in self.neighbors:
+            if cell not in self.junction_index and cell not in self.cell_edge:
+                self.junction_index[cell] = len(self.junctions)
+                self.junctions.append(cell)
+                self.adjacency.append([])
+                self.add_edges_from(self.junction_index[cell])
+
+    def add_edges_from(self, u):
+        """Đi theo từng hướng từ nút u tới nút giao kế tiếp, thêm các cạnh chưa có."""
+        start = self.junctions[u]
+        for first in self.neighbors[start]:
+            if first in self.cell_edge:
+                continue # Cạnh đã được thêm từ đầu kia
+            if first in self.junction_index and (self.junction_index[first] < u or first == start):
+                continue # Hai nút kề nhau: thêm một lần từ nút có chỉ số nhỏ hơn
+            cells = []
+            previous, cell = start, first
+            while cell not in self.junction_index:
+                cells.append(cell)
+                previous, cell = cell, next(nb for nb in self.neighbors[cell] if nb != previous)
+            v = self.junction_index[cell]
+            e = len(self.edges)
+            self.edges.append((u, v, cells))
+            for offset, corridor in enumerate(cells, 1):
+                self.cell_edge[corridor] = (e, offset)
+            self.adjacency[u].append((e, v, len(cells) + 1, True))
+            self.adjacency[v].append((e, u, len(cells) + 1, False))
+
+    def edge_cell(self, e, offset):
+        """Ô tại offset bước từ đầu u của cạnh e."""
+        u, v, cells = self.edges[e]
+        if offset == 0:
+            return self.junctions[u]
+        if offset == len(cells) + 1:
+            return self.junctions[v]
+        return cells[offset - 1]
+
+    def exits(self, cell):
+        """Các nút có thể đi tới đầu tiên từ cell: danh sách (nút, khoảng cách, (cạnh, offset đầu, offset cuối))."""
+        if cell in self.junction_index:
+            return [(self.junction_index[cell], 0, None)]
+        e, offset = self.cell_edge[cell]
+        u, v, cells = self.edges[e]
+        return [(u, offset, (e, offset, 0)), (v, len(cells) + 1 - offset, (e, offset, len(cells) + 1))]
+
+    def shortest_path(self, start, goal):
+        """
+        A* trên đồ thị nút giao, heuristic Manhattan tới goal; chỉ các nút giao được mở rộng, đường đi theo ô
+        được dựng lại ở cuối.
+        Returns:
+            list: Các ô từ start tới goal (gồm cả hai đầu), None nếu không tới được hoặc không phải ô trống.
+        """
+        if start not in self.neighbors or goal not in self.neighbors:
+            return None
+        if start == goal:
+            return [start]
+
+        # Các nút đi tới goal ở bước cuối: nút -> (khoảng cách, đoạn trên cạnh).
+        goal_entries = {}
+        for node, cost, segment in self.exits(goal):
+            if segment is not None:
+                e, offset, end = segment
+                segment = (e, end, offset) # chiều ngược lại: từ nút tới goal
+            if node not in goal_entries or cost < goal_entries[node][0]:
+                goal_entries[node] = (cost, segment)
+
+        def h(node):
+            cell = self.junctions[node]
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        GOAL = -1
+        best = {}
+        parent = {}
+        open_set = []
+        for node, cost, segment in self.exits(start):
+            if cost < best.get(node, float('inf')):
+                best[node] = cost
+                parent[node] = (None, segment)
+                heapq.heappush(open_set, (cost + h(node), cost, node))
+        # start và goal trên cùng một cạnh: đi thẳng trên cạnh.
+        if start in self.cell_edge and goal in self.cell_edge and self.cell_edge[start][0] == self.cell_edge[goal][0]:
+            e, offset = self.cell_edge[start]
+            cost = abs(offset - self.cell_edge[goal][1])
+            best[GOAL] = cost
+            parent[GOAL] = (None, (e, offset, self.cell_edge[goal][1]))
+            heapq.heappush(open_set, (cost, cost, GOAL))
+
+        while open_set:
+            f, g, node = heapq.heappop(open_set)
+            if g > best.get(node, float('inf')):
+                continue
+            if node == GOAL:
+                return self.expand(parent, start)
+            if node in goal_entries:
+                cost, segment = goal_entries[node]
+                if g + cost < best.get(GOAL, float('inf')):
+                    best[GOAL] = g + cost
+                    parent[GOAL] = (node, segment)
+                    heapq.heappush(open_set, (g + cost, g + cost, GOAL))
+            for e, other, length, forward in self.adjacency[node]:
+                if g + length < best.get(other, float('inf')):
+                    best[other] = g + length
+                    segment = (e, 0, length) if forward else (e, length, 0)
+                    parent[other] = (node, segment)
+                    heapq.heappush(open_set, (g + length + h(other), g + length, other))
+        return None
+
+    def expand(self, parent, start):
+        """Dựng đường đi theo ô từ các con trỏ cha của shortest_path."""
+        segments = []
+        node = -1
+        while node is not None:
+            node, segment = parent[node]
+            if segment is not None:
+                segments.append(segment)
+        path = [start]
+        for e, begin, end in reversed(segments):
+            step = 1 if end > begin else -1
+            path.extend(self.edge_cell(e, offset) for offset in range(begin + step, end + step, step))
+        return path
+
+
+# Đồ thị của các bản đồ gần đây, dùng chung giữa các agent và các episode trong một tiến trình.
+_graphs = OrderedDict()
+MAX_CACHED_GRAPHS = 4
+
+
+def get_junction_graph(grid):
+    """JunctionGraph dùng chung của bản đồ grid."""
+    array = np.asarray(grid, dtype=np.uint8)
+    key = (array.shape, array.tobytes())
+    graph = _graphs.get(key)
+    if graph is None:
+        graph = JunctionGraph(array)
+        _graphs[key] = graph
+        if len(_graphs) > MAX_CACHED_GRAPHS:
+            _graphs.popitem(last=False)
+    else:
+        _graphs.move_to_end(key)
+    return graph
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from distance_fields import get_field_cache, wavefront_bfs
+
+# Số landmark mặc định cho mỗi bản đồ.
+DEFAULT_LANDMARKS = 8
+
+
+class LandmarkHeuristic:
+    """
+    Heuristic ALT (A*, landmark, bất đẳng thức tam giác): chọn K ô landmark và lưu khoảng cách BFS từ mỗi
+    landmark tới mọi ô. Với mọi landmark L, d(a, b) >= |d(L, a) - d(L, b)|, nên max của các cận này (và của
+    khoảng cách Manhattan) là heuristic chấp nhận được và nhất quán, tính trong O(K) với K * số ô số nguyên
+    thay vì bảng mọi cặp. Tọa độ tính từ 0.
+    """
+
+    def __init__(self, grid, n_landmarks=DEFAULT_LANDMARKS):
+        fields = get_field_cache(grid)
+        self.n_rows, self.n_cols = fields.n_rows, fields.n_cols
+        free = np.flatnonzero(np.asarray(grid).reshape(-1) == 0)
+        self.landmarks = []
+        rows = []
+        if len(free):
+            # Chọn xa nhất: mỗi landmark mới là ô xa nhất tới các landmark đã chọn; ô chưa landmark nào tới được
+            # (thành phần liên thông khác) được ưu tiên, nên mỗi thành phần có landmark khi K đủ lớn.
+            nearest = np.full(len(free), np.iinfo(np.int64).max)
+            # Landmark đầu tiên là ô xa nhất từ một ô bất kỳ, một đầu của đường kính bản đồ.
+            row = wavefront_bfs(fields.neighbors, [free[0]], dtype=np.int32)[0]
+            candidate = free[np.argmax(row[free])]
+            for _ in range(min(n_landmarks, len(free))):
+                row = wavefront_bfs(fields.neighbors, [candidate], dtype=np.int32)[0]
+                self.landmarks.append(int(candidate))
+                rows.append(row)
+                reached = row[free] >= 0
+                nearest[reached] = np.minimum(nearest[reached], row[free][reached])
+                if nearest.max() == 0:
+                    break # Mọi ô đã là landmark
+                candidate = free[np.argmax(nearest)]
+        # Bảng [số ô][K] dạng list để tính heuristic bằng Python thuần mà không qua numpy.
+        self.table = np.array(rows, dtype=np.int32).T.tolist() if rows else [[]] * (self.n_rows * self.n_cols)
+
+    def distance_bound(self, pos, goal):
+        """Cận dưới của số bước từ pos tới goal, -1 nếu một landmark cho thấy hai ô không liên thông."""
+        return self.to(goal)(pos)
+
+    def to(self, goal):
+        """Heuristic tới goal, dùng được như hàm h(pos) hay như bảng h[pos]."""
+        return GoalHeuristic(self, goal)
+
+
+class GoalHeuristic:
+    """Heuristic ALT tới một đích cố định."""
+
+    __slots__ = ('goal', 'goal_row', 'table', 'n_cols')
+
+    def __init__(self, landmarks, goal):
+        self.goal = (int(goal[0]), int(goal[1]))
+        self.table = landmarks.table
+        self.n_cols = landmarks.n_cols
+        self.goal_row = self.table[self.goal[0] * self.n_cols + self.goal[1]]
+
+    def __call__(self, pos):
+        bound = abs(pos[0] - self.goal[0]) + abs(pos[1] - self.goal[1])
+        for a, b in zip(self.table[pos[0] * self.n_cols + pos[1]], self.goal_row):
+            if (a < 0) != (b < 0):
+                return -1
+            if abs(a - b) > bound and a >= 0:
+                bound = abs(a - b)
+        return bound
+
+    __getitem__ = __call__
+
+
+# Landmark của các bản đồ gần đây, dùng chung giữa các agent và các episode trong một tiến trình.
+_heuristics = OrderedDict()
+MAX_CACHED_MAPS = 4
+
+
+def get_landmark_heuristic(grid, n_landmarks=DEFAULT_LANDMARKS):
+    """LandmarkHeuristic dùng chung của bản đồ grid."""
+    array = np.asarray(grid, dtype=np.uint8)
+    key = (array.shape, array.tobytes(), n_landmarks)
+    heuristic = _heuristics.get(key)
+    if heuristic is None:
+        heuristic = LandmarkHeuristic(array, n_landmarks)
+        _heuristics[key] = heuristic
+        if len(_heuristics) > MAX_CACHED_MAPS:
+            _heuristics.popitem(last=False)
+    else:
+        _heuristics.move_to_end(key)
+    return heuristic
@@ -1,10 +1,8 @@
 from env import Environment
-# from greedyagent import GreedyAgents as Agents
-from agentversion2 import AgentsVersion2 as Agents
-# from cbs_agent import CBSAgent as Agents
-# from astar_base import AStarBase as Agents
-# from astar_prioritized_planning import AgentsPrioritizedPlanning as Agents
+from trajectory import TrajectoryRecorder
+from agent_registry import AGENTS, load_agent
 
+import sys
 import numpy as np
 
 if __name__=="__main__":
@@ -14,17 +12,42 @@ if __name__=="__main__":
     parser.add_argument("--n_packages", type=int, default=10, help="Number of packages")
     parser.add_argument("--max_steps", type=int, default=100, help="Maximum number of steps per episode")
     parser.add_argument("--seed", type=int, default=10, help="Random seed for reproducibility")
-    parser.add_argument("--max_time_steps", type=int, default=1000, help="Maximum time steps for the environment")
+    parser.add_argument("--max_time_steps", type=int, default=None,
+                        help="Maximum time steps for the environment, 1000 or the one of the scenario by default")
     parser.add_argument("--map", type=str, default="map5.txt", help="Map name")
+    parser.add_argument("--agent", type=str, default="v2",
+                        help="Agent: one of %s, or module:Class" % ", ".join(AGENTS))
+    parser.add_argument("--scenario", type=str, default=None,
+                        help="Scenario file recorded by scenario.py, replacing the seed, agent and package counts")
+    parser.add_argument("--record", type=str, default=None,
+                        help="Trajectory file to record the episode to, see trajectory.TrajectoryReplayer")
+    parser.add_argument("--worker", action="store_true",
+                        help="Serve episodes for JSON lines read on stdin, one JSON result line each on stdout")
 
     args = parser.parse_args()
+    # A scenario keeps its own max_time_steps unless it is given explicitly.
+    env_kwargs = {} if args.max_time_steps is None else {'max_time_steps': args.max_time_steps}
+    if args.max_time_steps is None and (args.worker or not args.scenario):
+        args.max_time_steps = 1000
+    if args.worker:
+        from sweep import serve
+        serve(sys.stdin, sys.stdout, {'map': args.map, 'seed': args.seed, 'num_agents': args.num_agents,
+                                      'n_packages': args.n_packages, 'max_time_steps': args.max_time_steps,
+                                      'agent': args.agent})
+        sys.exit(0)
     np.random.seed(args.seed)
+    Agents = load_agent(args.agent)
 
-    env = Environment(map_file=args.map, max_time_steps=args.max_time_steps,
-                      n_robots=args.num_agents, n_packages=args.n_packages,
-                      seed = args.seed)
-    
-    state = env.reset()
+    if args.scenario:
+        # The constructor already loaded the first episode of the scenario.
+        env = Environment.from_scenario(args.scenario, args.map, seed=args.seed, **env_kwargs)
+        state = env.get_state()
+    else:
+        env = Environment(map_file=args.map, max_time_steps=args.max_time_steps,
+                          n_robots=args.num_agents, n_packages=args.n_packages,
+                          seed = args.seed)
+        state = env.reset()
+    recorder = TrajectoryRecorder(args.record, env) if args.record else None
     agents = Agents()
     agents.init_agents(state)
     #env.render()
@@ -37,6 +60,8 @@ if __name__=="__main__":
         env.render()
         t += 1
 
+    if recorder is not None:
+        recorder.close()
     print("Episode finished")
     print("Total reward:", infos['total_reward'])
     print("Total time steps:", infos['total_time_steps'])
\ No newline at end of file
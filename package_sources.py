@@ -0,0 +1,173 @@
+import numpy as np
+
+
+class RandomPackageSource:
+    """
+    Unbounded stream of random packages for lifelong episodes, see Environment(package_source=...).
+    Packages are drawn like Environment.generate_scenario: distinct random free start and target cells
+    and a deadline 10 + [n_rows / 2, 3 * n_rows) steps after the release. The number of packages
+    released at each time step is Poisson(rate), except at t = 0 where n_initial are released.
+    The packages of a time step only depend on the seed and on the block of time steps it belongs to,
+    so the stream is reproducible and its state is the seed alone.
+    """
+
+    def __init__(self, rate=0.2, n_initial=None, until=None, block_size=1024):
+        """
+        :param rate: Mean number of packages released per time step.
+        :param n_initial: Packages released at t = 0, min(n_robots, 20) + 1 if None (as reset()).
+        :param until: No package is released after this time step, unbounded if None.
+        :param block_size: Number of time steps drawn at once.
+        """
+        self.rate = rate
+        self.n_initial = n_initial
+        self.until = until
+        self.block_size = block_size
+        self.seed = None
+        self.block = None
+
+    def reset(self, env):
+        """
+        Starts a new stream on the map of env, seeded from the env RNG.
+        """
+        self.free_cells = env.free_cells
+        self.n_rows = env.n_rows
+        self.initial = min(env.n_robots, 20) + 1 if self.n_initial is None else self.n_initial
+        self.set_state(int(env.rng.randint(0, 2**31)))
+
+    def get_state(self):
+        return self.seed
+
+    def set_state(self, state):
+        if state != self.seed:
+            self.seed = state
+            self.block = None
+
+    def get_block(self, b):
+        """
+        Returns the packages of the b-th block of time steps, a list with one list of
+        (start, target, deadline) per time step.
+        """
+        if self.block is not None and self.block[0] == b:
+            return self.block[1]
+        rng = np.random.RandomState([self.seed, b])
+        counts = rng.poisson(self.rate, self.block_size)
+        first = b * self.block_size
+        if first == 0:
+            counts[0] = self.initial
+        if self.until is not None:
+            counts[max(self.until + 1 - first, 0):] = 0
+        total = int(counts.sum())
+        n_cells = len(self.free_cells)
+        starts = rng.randint(0, n_cells, total)
+        # A non-zero shift modulo the number of cells gives a target different from the start.
+        targets = (starts + rng.randint(1, n_cells, total)) % n_cells
+        to_deadline = 10 + rng.randint(self.n_rows // 2, 3 * self.n_rows, total)
+        times = np.repeat(np.arange(first, first + self.block_size), counts)
+
+        packages = [[] for _ in range(self.block_size)]
+        for start, target, t, delay in zip(starts.tolist(), targets.tolist(), times.tolist(), to_deadline.tolist()):
+            packages[t - first].append((self.free_cells[start], self.free_cells[target], t + delay))
+        self.block = (b, packages)
+        return packages
+
+    def packages_at(self, t):
+        """
+        Returns the (start, target, deadline) of the packages released at time step t.
+        """
+        return self.get_block(t // self.block_size)[t % self.block_size]
+
+    def next_release(self, t, end):
+        """
+        Returns the first time step in (t, end] releasing packages, or None.
+        """
+        if self.until is not None:
+            end = min(end, self.until)
+        for t in range(t + 1, end + 1):
+            if self.packages_at(t):
+                return t
+        return None
+
+    def exhausted(self, t):
+        """
+        Tells whether no package is released after time step t.
+        """
+        return self.until is not None and t >= self.until
+
+
+class FilePackageSource:
+    """
+    Streams packages from a text file with one package per line:
+        start_time start_row start_col target_row target_col deadline
+    with 1-based cells as in Environment.get_state, ordered by start_time.
+    Only the next line is kept in memory; the state is the position in the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.pending = None
+        self.offset = 0
+
+    def reset(self, env):
+        if self.file is None:
+            self.file = open(self.path, 'r')
+        self.set_state(0)
+
+    def get_state(self):
+        return self.offset
+
+    def set_state(self, state):
+        self.file.seek(state)
+        self.pending = None
+        self.read_next()
+        self.offset = state
+
+    def read_next(self):
+        """
+        Reads the next package line into self.pending, None at the end of the file.
+        """
+        while True:
+            line = self.file.readline()
+            if not line:
+                self.pending = None
+                return
+            values = line.split()
+            if values:
+                break
+        start_time, sr, sc, tr, tc, deadline = (int(x) for x in values)
+        if self.pending is not None and start_time < self.pending[0]:
+            raise ValueError("Packages must be ordered by start_time in " + self.path)
+        self.pending = (start_time, (sr - 1, sc - 1), (tr - 1, tc - 1), deadline)
+
+    def packages_at(self, t):
+        """
+        Returns the (start, target, deadline) of the packages released at time step t.
+        The time steps must be asked in increasing order.
+        """
+        packages = []
+        while self.pending is not None and self.pending[0] <= t:
+            start_time, start, target, deadline = self.pending
+            if start_time == t:
+                packages.append((start, target, deadline))
+            self.offset = self.file.tell()
+            self.read_next()
+        return packages
+
+    def next_release(self, t, end):
+        """
+        Returns the first time step in (t, end] releasing packages, or None.
+        """
+        if self.pending is None or self.pending[0] > end:
+            return None
+        return max(self.pending[0], t + 1)
+
+    def exhausted(self, t):
+        """
+        Tells whether no package is released after time step t.
+        """
+        return self.pending is None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,69 @@
+class ReservationTable:
+    """
+    Bảng đặt chỗ không gian - thời gian cho Prioritized Planning: robot có độ ưu tiên cao đặt trước các ô
+    (ô, t) và các cạnh (ô, ô kế, t) trên đường đi của nó, robot sau kiểm tra một bước đi trong O(1) bằng tra
+    bảng băm thay vì duyệt danh sách ràng buộc. Thời gian là bước tuyệt đối của môi trường.
+    Một robot có thể giữ ô đích từ lúc tới nơi trở đi (goal hold): ô đó bị chặn với mọi t lớn hơn.
+    """
+
+    def __init__(self):
+        self.vertices = {}  # (ô, t) -> robot đặt chỗ
+        self.edges = {}  # (ô, ô kế, t) -> robot đi từ ô sang ô kế, tới nơi lúc t
+        self.goal_holds = {}  # ô -> (t bắt đầu giữ, robot)
+        self.by_cell = {}  # ô -> {t: robot}, để dựng các khoảng an toàn của một ô
+
+    def clear(self):
+        self.vertices.clear()
+        self.edges.clear()
+        self.goal_holds.clear()
+        self.by_cell.clear()
+
+    def reserve_vertex(self, cell, t, owner):
+        self.vertices[(cell, t)] = owner
+        self.by_cell.setdefault(cell, {})[t] = owner
+
+    def reserve_edge(self, cell, next_cell, t, owner):
+        self.edges[(cell, next_cell, t)] = owner
+
+    def reserve_path(self, path, start_time, owner, hold_goal=False):
+        """
+        Đặt chỗ cả đường đi: ô path[i] lúc start_time + i và các cạnh giữa chúng. Nếu hold_goal, robot giữ ô
+        cuối từ lúc tới nơi trở đi.
+        """
+        for i, cell in enumerate(path):
+            self.reserve_vertex(cell, start_time + i, owner)
+            if i > 0 and path[i - 1] != cell:
+                self.reserve_edge(path[i - 1], cell, start_time + i, owner)
+        if hold_goal and path:
+            self.goal_holds[path[-1]] = (start_time + len(path) - 1, owner)
+
+    def vertex_free(self, cell, t, owner=None):
+        """Ô cell lúc t không bị robot khác đặt hay giữ."""
+        reserved = self.vertices.get((cell, t))
+        if reserved is not None and reserved != owner:
+            return False
+        hold = self.goal_holds.get(cell)
+        return hold is None or t < hold[0] or hold[1] == owner
+
+    def move_free(self, cell, next_cell, t, owner=None):
+        """Robot owner đi từ cell sang next_cell (hoặc đứng yên), tới nơi lúc t, không va chạm: ô đích còn trống
+        và không có robot khác đi ngược cạnh đó cùng lúc."""
+        if not self.vertex_free(next_cell, t, owner):
+            return False
+        if cell == next_cell:
+            return True
+        swapped = self.edges.get((next_cell, cell, t))
+        return swapped is None or swapped == owner
+
+    def can_hold(self, cell, t, owner=None):
+        """Robot owner có thể dừng lại ở cell từ lúc t trở đi: không robot khác đặt ô này sau t."""
+        if any(time > t and reserved != owner for time, reserved in self.by_cell.get(cell, {}).items()):
+            return False
+        hold = self.goal_holds.get(cell)
+        return hold is None or hold[1] == owner
+
+    def blocked_times(self, cell, owner=None):
+        """Các thời điểm ô cell bị robot khác đặt, tăng dần, và thời điểm bắt đầu bị giữ mãi (None nếu không)."""
+        times = sorted(time for time, reserved in self.by_cell.get(cell, {}).items() if reserved != owner)
+        hold = self.goal_holds.get(cell)
+        return times, (hold[0] if hold is not None and hold[1] != owner else None)
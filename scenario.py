@@ -0,0 +1,119 @@
+import hashlib
+import struct
+
+import numpy as np
+
+# Binary scenario file, all little-endian:
+#   header (HEADER_SIZE bytes): magic, SHA-256 of the map, then n_rows, n_cols, n_episodes,
+#       n_robots, n_packages, max_time_steps as int64,
+#   robots: int32 [n_episodes, n_robots, 2] of 0-based start cells,
+#   packages: int32 [n_episodes, n_packages, 6] of (start_row, start_col, target_row, target_col,
+#       start_time, deadline), ordered by package_id.
+# An episode is the outcome of one Environment.reset(), in the order of the resets.
+SCENARIO_MAGIC = b'MARLSCN1'
+HEADER_FORMAT = '<8s32s6q'
+HEADER_SIZE = 128
+
+
+def map_digest(grid):
+    """
+    Returns the SHA-256 digest of a map grid, stored in the scenario files to check the map.
+    """
+    grid = np.asarray(grid, dtype=np.uint8)
+    return hashlib.sha256(struct.pack('<2q', *grid.shape) + grid.tobytes()).digest()
+
+
+class Scenario:
+    """
+    Episodes of a scenario file, memory-mapped: an episode is only read when it is used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+        if len(header) < struct.calcsize(HEADER_FORMAT) or header[:8] != SCENARIO_MAGIC:
+            raise ValueError(path + " is not a scenario file.")
+        (_, self.map_digest, self.n_rows, self.n_cols, self.n_episodes, self.n_robots, self.n_packages,
+         self.max_time_steps) = struct.unpack(HEADER_FORMAT, header)
+        E, R, P = self.n_episodes, self.n_robots, self.n_packages
+        self.robots = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_SIZE, shape=(E, R, 2))
+        self.packages = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_SIZE + 8 * E * R,
+                                  shape=(E, P, 6))
+
+    def episode(self, e):
+        """
+        Returns episode e in the format of Environment.generate_scenario: (robot positions,
+        list of (start_time, start, target, deadline)).
+        """
+        if not 0 <= e < self.n_episodes:
+            raise IndexError("Scenario %s has %d episodes, episode %d was asked." % (self.path, self.n_episodes, e))
+        robot_cells = [tuple(cell) for cell in self.robots[e].tolist()]
+        list_packages = [(start_time, (sr, sc), (tr, tc), deadline)
+                         for sr, sc, tr, tc, start_time, deadline in self.packages[e].tolist()]
+        return robot_cells, list_packages
+
+
+def save_scenario(path, grid, episodes, max_time_steps):
+    """
+    Writes episodes to a scenario file.
+    :param grid: Map of the episodes.
+    :param episodes: List of (robot positions, packages), packages being Package objects or
+        (start_time, start, target, deadline) tuples ordered by package_id.
+    :param max_time_steps: Episode length the packages were drawn for.
+    """
+    n_robots = len(episodes[0][0]) if episodes else 0
+    n_packages = len(episodes[0][1]) if episodes else 0
+    robots = np.zeros((len(episodes), n_robots, 2), dtype='<i4')
+    packages = np.zeros((len(episodes), n_packages, 6), dtype='<i4')
+    for e, (robot_cells, episode_packages) in enumerate(episodes):
+        if len(robot_cells) != n_robots or len(episode_packages) != n_packages:
+            raise ValueError("All the episodes of a scenario must have the same numbers of robots and packages.")
+        robots[e] = robot_cells
+        for j, package in enumerate(episode_packages):
+            if not isinstance(package, tuple):
+                package = (package.start_time, package.start, package.target, package.deadline)
+            start_time, start, target, deadline = package
+            packages[e, j] = (start[0], start[1], target[0], target[1], start_time, deadline)
+
+    n_rows = len(grid)
+    n_cols = len(grid[0]) if grid else 0
+    header = struct.pack(HEADER_FORMAT, SCENARIO_MAGIC, map_digest(grid), n_rows, n_cols, len(episodes),
+                         n_robots, n_packages, max_time_steps)
+    with open(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(robots.tobytes())
+        f.write(packages.tobytes())
+
+
+def record_scenario(path, env, n_episodes):
+    """
+    Records the current episode of env and the next n_episodes - 1 resets to a scenario file.
+    """
+    episodes = []
+    for e in range(n_episodes):
+        if e:
+            env.reset()
+        episodes.append(([robot.position for robot in env.robots], list(env.packages)))
+    save_scenario(path, env.grid, episodes, env.max_time_steps)
+
+
+if __name__ == "__main__":
+    import argparse
+    from env import Environment
+
+    parser = argparse.ArgumentParser(description="Record the episodes of a seed to a binary scenario file")
+    parser.add_argument("--num_agents", type=int, default=5, help="Number of agents")
+    parser.add_argument("--n_packages", type=int, default=10, help="Number of packages")
+    parser.add_argument("--seed", type=int, default=10, help="Random seed")
+    parser.add_argument("--max_time_steps", type=int, default=1000, help="Maximum time steps for the environment")
+    parser.add_argument("--map", type=str, default="map5.txt", help="Map name")
+    parser.add_argument("--episodes", type=int, default=1,
+                        help="Number of episodes to record, main.py --scenario plays the first one")
+    parser.add_argument("--out", type=str, required=True, help="Scenario file to write")
+    args = parser.parse_args()
+
+    env = Environment(map_file=args.map, max_time_steps=args.max_time_steps,
+                      n_robots=args.num_agents, n_packages=args.n_packages, seed=args.seed)
+    record_scenario(args.out, env, args.episodes)
+    print("Recorded", args.episodes, "episodes to", args.out)
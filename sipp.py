@@ -0,0 +1,138 @@
+import heapq
+
+from reservation_table import ReservationTable
+
+INF = float('inf')
+
+
+class SafeIntervalPlanner:
+    """
+    Safe Interval Path Planning (Phillips & Likhachev): thay vì trạng thái (ô, t) với các bước chờ riêng lẻ,
+    dòng thời gian của mỗi ô được gộp thành các khoảng an toàn giữa các lần ô bị đặt chỗ, và trạng thái là
+    (ô, khoảng an toàn) với thời điểm tới sớm nhất. Một bước chờ dài chỉ là một lần mở rộng, nên số trạng thái
+    tỉ lệ với số đặt chỗ chứ không với độ dài của các lần chờ. Đường đi trả về vẫn theo từng bước thời gian
+    (có các ô lặp lại khi chờ), như các tìm kiếm A* có ràng buộc của PP và CBS. Tọa độ tính từ 0.
+    """
+
+    def __init__(self, grid_map):
+        self.grid_map = grid_map
+        self.n_rows, self.n_cols = len(grid_map), len(grid_map[0])
+        self.expansions = 0  # Số trạng thái được mở rộng trong lần tìm gần nhất
+
+    def neighbors(self, cell):
+        r, c = cell
+        for next_cell in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= next_cell[0] < self.n_rows and 0 <= next_cell[1] < self.n_cols and \
+                    self.grid_map[next_cell[0]][next_cell[1]] == 0:
+                yield next_cell
+
+    @staticmethod
+    def safe_intervals(cell, reservations, owner, begin=0):
+        """Các khoảng [bắt đầu, kết thúc] (kết thúc có thể là INF) từ begin trong đó cell không bị robot khác đặt."""
+        times, hold = reservations.blocked_times(cell, owner)
+        end = INF if hold is None else hold - 1
+        intervals = []
+        for t in times:
+            if t < begin:
+                continue
+            if t > end:
+                break
+            if t > begin:
+                intervals.append((begin, t - 1))
+            begin = t + 1
+        if begin <= end:
+            intervals.append((begin, end))
+        return intervals
+
+    def search(self, start, goal, reservations, heuristic, start_time=0, owner=None, hold_goal=False):
+        """
+        Tìm đường đi ngắn nhất theo thời gian tới đích tránh các đặt chỗ.
+        Args:
+            start: Vị trí bắt đầu, robot ở đó lúc start_time
+            goal: Vị trí đích
+            reservations: ReservationTable (thời gian cùng mốc với start_time)
+            heuristic: Hàm h(pos), cận dưới số bước tới goal, âm nếu không tới được
+            start_time: Thời điểm bắt đầu
+            owner: Robot đang tìm đường, các đặt chỗ của chính nó được bỏ qua
+            hold_goal: Chỉ nhận đích trong khoảng an toàn không kết thúc, tức robot đứng lại đó được mãi
+        Returns:
+            list: Vị trí ở mỗi bước từ start_time tới khi tới đích, None nếu không tìm thấy
+        """
+        self.expansions = 0
+        if heuristic(start) < 0:
+            return None
+        # Robot đang ở start lúc start_time dù ô có bị đặt lúc đó hay không: khoảng đầu tiên bắt đầu từ start_time,
+        # nối với khoảng an toàn ngay sau nếu có để robot vẫn chờ được ở start.
+        intervals = {start: self.safe_intervals(start, reservations, owner, start_time)}
+        first = intervals[start][0] if intervals[start] else None
+        if first is None or first[0] > start_time + 1:
+            intervals[start] = [(start_time, start_time)] + intervals[start]
+        elif first[0] == start_time + 1:
+            intervals[start][0] = (start_time, first[1])
+
+        state = (start, 0)
+        best = {state: start_time}
+        parent = {state: None}
+        open_set = [(start_time + heuristic(start), -start_time, state)]
+        while open_set:
+            f_score, neg_time, state = heapq.heappop(open_set)
+            time_step = -neg_time
+            if time_step > best[state]:
+                continue
+            self.expansions += 1
+            cell, index = state
+            interval_end = intervals[cell][index][1]
+            if cell == goal and (not hold_goal or interval_end == INF):
+                return self.build_path(parent, best, state)
+
+            for next_cell in self.neighbors(cell):
+                h = heuristic(next_cell)
+                if h < 0:
+                    continue
+                if next_cell not in intervals:
+                    intervals[next_cell] = self.safe_intervals(next_cell, reservations, owner)
+                for next_index, (begin, end) in enumerate(intervals[next_cell]):
+                    if begin > interval_end + 1:
+                        break
+                    # Chờ ở cell tới arrival - 1 (vẫn trong khoảng an toàn của cell) rồi đi sang next_cell
+                    last = min(interval_end + 1, end)
+                    arrival = max(time_step + 1, begin)
+                    while arrival <= last and not reservations.move_free(cell, next_cell, arrival, owner):
+                        arrival += 1 # Có robot khác đi ngược cạnh này cùng lúc
+                    if arrival > last:
+                        continue
+                    next_state = (next_cell, next_index)
+                    if arrival < best.get(next_state, INF):
+                        best[next_state] = arrival
+                        parent[next_state] = state
+                        heapq.heappush(open_set, (arrival + h, -arrival, next_state))
+        return None
+
+    @staticmethod
+    def build_path(parent, best, state):
+        """Dựng đường đi theo từng bước: chờ ở mỗi ô cho tới thời điểm tới ô kế tiếp."""
+        states = []
+        while state is not None:
+            states.append(state)
+            state = parent[state]
+        states.reverse()
+        path = []
+        for (cell, index), next_state in zip(states, states[1:]):
+            path.extend([cell] * (best[next_state] - best[(cell, index)]))
+        path.append(states[-1][0])
+        return path
+
+
+def constraints_to_reservations(constraints):
+    """
+    ReservationTable từ danh sách ràng buộc của CBS: {'time': t, 'loc': [ô]} chặn ô lúc t,
+    {'time': t, 'loc': [ô kế, ô]} chặn bước đi từ ô sang ô kế tới nơi lúc t.
+    """
+    reservations = ReservationTable()
+    for constraint in constraints:
+        if len(constraint['loc']) == 1:
+            reservations.reserve_vertex(constraint['loc'][0], constraint['time'], 'constraint')
+        else:
+            # move_free chặn cell -> next_cell lúc t khi có cạnh (next_cell, cell, t)
+            reservations.reserve_edge(constraint['loc'][0], constraint['loc'][1], constraint['time'], 'constraint')
+    return reservations
@@ -0,0 +1,188 @@
+"""
+Runs a grid of episodes (maps x seeds x agents x environment parameters) on a process pool and
+streams one result row per episode, as soon as it finishes, to a CSV or JSON lines file.
+
+    python sweep.py sweep.json --workers 8 --out results.csv
+    python sweep.py --maps map1.txt map2.txt --seeds 10 42 --agents v2 greedy --n_packages 100
+
+The sweep file is a JSON object whose values are lists, their product being the grid:
+    {"seeds": [...], "agents": ["v2", "module:Class", ...], "max_time_steps": [...],
+     "maps": ["map1.txt", {"map": "map3.txt", "num_agents": 5, "n_packages": 500}, ...]}
+A map given as an object overrides the other parameters for that map. Agents are names of
+agent_registry.AGENTS or 'module:Class' specs.
+Each episode is played as in main.py. The workers live for the whole sweep, so the imports, the loaded
+maps and the per-map precompute of the agents (e.g. the distance oracle) are reused by the episodes of a map.
+serve() runs episodes for JSON lines requests in the same way, see main.py --worker.
+"""
+import contextlib
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from agent_registry import load_agent
+from env import Environment
+
+DEFAULTS = {'num_agents': 5, 'n_packages': 10, 'max_time_steps': 1000}
+RESULT_FIELDS = ['map', 'seed', 'agent', 'num_agents', 'n_packages', 'max_time_steps',
+                 'total_reward', 'delivered', 'on_time', 'steps', 'wall_time']
+
+_environments = {} # (map, max_time_steps, num_agents, n_packages) -> Environment reused by the episodes.
+
+
+def expand_grid(sweep):
+    """
+    Returns the episodes of a sweep, grouped by map so that a worker keeps meeting the same map.
+    :param sweep: dict of lists, see the module docstring.
+    :return: List of episode configs, dicts with the keys of DEFAULTS, 'map', 'seed' and 'agent'.
+    """
+    params = {key: sweep.get(key, [value]) for key, value in DEFAULTS.items()}
+    configs = []
+    for entry in sweep['maps']:
+        if not isinstance(entry, dict):
+            entry = {'map': entry}
+        overrides = {key: [value] for key, value in entry.items() if key != 'map'}
+        grid = dict(params, seed=sweep['seeds'], agent=sweep['agents'], **overrides)
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            configs.append(dict(zip(keys, values), map=entry['map']))
+    return configs
+
+
+def run_episode(config):
+    """
+    Plays one episode as main.py does and returns its result row.
+    """
+    start = time.perf_counter()
+    np.random.seed(config['seed'])
+    random.seed(config['seed'])
+    key = (config['map'], config['max_time_steps'], config['num_agents'], config['n_packages'])
+    env = _environments.get(key)
+    if env is None:
+        env = Environment(map_file=config['map'], max_time_steps=config['max_time_steps'],
+                          n_robots=config['num_agents'], n_packages=config['n_packages'], seed=config['seed'])
+        _environments[key] = env
+    else:
+        env.reseed(config['seed'])
+    state = env.reset()
+    agents = load_agent(config['agent'])()
+    agents.init_agents(state)
+
+    on_time = 0
+    done = False
+    infos = {}
+    while not done:
+        actions = agents.get_actions(state)
+        carrying = [robot.carrying for robot in env.robots]
+        t = env.t
+        state, reward, done, infos = env.step(actions)
+        for package_id, robot in zip(carrying, env.robots):
+            # A carried package that is no longer carried has been delivered.
+            if package_id and robot.carrying == 0 and t <= env.packages[package_id - 1].deadline:
+                on_time += 1
+
+    return dict(config, total_reward=infos['total_reward'], delivered=env.n_delivered, on_time=on_time,
+                steps=infos['total_time_steps'], wall_time=time.perf_counter() - start)
+
+
+class ResultWriter:
+    """
+    Writes result rows to a CSV file, or JSON lines if the path ends with .json or .jsonl, flushing
+    each row.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='') if path else sys.stdout
+        self.json = bool(path) and path.endswith(('.json', '.jsonl'))
+        if not self.json:
+            self.csv = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.json:
+            self.file.write(json.dumps({key: row[key] for key in RESULT_FIELDS}) + '\n')
+        else:
+            self.csv.writerow({key: row[key] for key in RESULT_FIELDS})
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def serve(infile, outfile, defaults=None):
+    """
+    Plays one episode per JSON line of infile and writes its result row as a JSON line to outfile,
+    until the end of infile. A request holds the keys of a config, missing ones are taken from
+    defaults; a request that fails gets {"error": message}. What the agents print goes to stderr.
+    """
+    defaults = dict(DEFAULTS, **(defaults or {}))
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            config = dict(defaults, **json.loads(line))
+            with contextlib.redirect_stdout(sys.stderr):
+                row = run_episode(config)
+            reply = {key: row[key] for key in RESULT_FIELDS}
+        except Exception as e:
+            reply = {'error': '%s: %s' % (type(e).__name__, e)}
+        outfile.write(json.dumps(reply) + '\n')
+        outfile.flush()
+
+
+def run_sweep(configs, out=None, workers=None):
+    """
+    Runs the episodes on a pool of workers processes and writes their results as they finish.
+    :param workers: Number of processes, os.cpu_count() if None; 0 runs in this process.
+    :return: The result rows, in finishing order.
+    """
+    writer = ResultWriter(out)
+    results = []
+    try:
+        if workers == 0:
+            for config in configs:
+                results.append(run_episode(config))
+                writer.write(results[-1])
+        else:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                futures = [pool.submit(run_episode, config) for config in configs]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    writer.write(results[-1])
+    finally:
+        writer.close()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a grid of delivery episodes in parallel")
+    parser.add_argument("sweep", type=str, nargs='?', default=None,
+                        help="JSON sweep file, the other grid options are used without it")
+    parser.add_argument("--maps", type=str, nargs='+', default=["map.txt"], help="Map names")
+    parser.add_argument("--seeds", type=int, nargs='+', default=[2025], help="Random seeds")
+    parser.add_argument("--agents", type=str, nargs='+', default=["v2"],
+                        help="Agent names of agent_registry.AGENTS or module:Class")
+    parser.add_argument("--num_agents", type=int, nargs='+', default=[DEFAULTS['num_agents']])
+    parser.add_argument("--n_packages", type=int, nargs='+', default=[DEFAULTS['n_packages']])
+    parser.add_argument("--max_time_steps", type=int, nargs='+', default=[DEFAULTS['max_time_steps']])
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, all the cores by default")
+    parser.add_argument("--out", type=str, default=None, help="CSV or .json/.jsonl result file, stdout by default")
+    args = parser.parse_args()
+
+    if args.sweep:
+        with open(args.sweep) as f:
+            sweep = json.load(f)
+    else:
+        sweep = {'maps': args.maps, 'seeds': args.seeds, 'agents': args.agents, 'num_agents': args.num_agents,
+                 'n_packages': args.n_packages, 'max_time_steps': args.max_time_steps}
+    start = time.perf_counter()
+    results = run_sweep(expand_grid(sweep), args.out, args.workers)
+    print("Ran %d episodes in %.1fs" % (len(results), time.perf_counter() - start), file=sys.stderr)
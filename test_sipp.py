@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+from astar_prioritized_planning import AgentsPrioritizedPlanning
+from reservation_table import ReservationTable
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_planner(map_name):
+    with open(os.path.join(ROOT, map_name)) as f:
+        grid = [[int(x) for x in line.split()] for line in f if line.strip()]
+    planner = AgentsPrioritizedPlanning()
+    planner.init_agents({'map': grid, 'robots': [], 'packages': [], 'time_step': 0})
+    planner.max_delay = 100
+    return planner, grid
+
+
+def free_neighbors(grid, cell):
+    r, c = cell
+    return [(r + dr, c + dc) for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= r + dr < len(grid) and 0 <= c + dc < len(grid[0]) and grid[r + dr][c + dc] == 0]
+
+
+def both_searches(planner, start, goal, table, start_time, hold_goal=False):
+    """Paths of the time-expanded A* and of SIPP for robot 0, checked against the reservations."""
+    paths = []
+    for use_sipp in (False, True):
+        planner.use_sipp = use_sipp
+        path = planner.a_star_with_constraints(start, goal, 0, table, start_time, hold_goal)
+        if path is not None:
+            assert path[0] == start and path[-1] == goal
+            for i in range(1, len(path)):
+                assert table.move_free(path[i - 1], path[i], start_time + i, 0)
+            if hold_goal:
+                assert table.can_hold(goal, start_time + len(path) - 1, 0)
+        paths.append(path)
+    return paths
+
+
+def test_sipp_matches_time_expanded_search_on_random_reservations():
+    rng = np.random.default_rng(2025)
+    for map_name in ('map1.txt', 'map2.txt'):
+        planner, grid = load_planner(map_name)
+        free = [(r, c) for r in range(len(grid)) for c in range(len(grid[0])) if grid[r][c] == 0]
+        for trial in range(25):
+            table = ReservationTable()
+            start_time = int(rng.integers(0, 20))
+            # Random walks of the other robots, some of them holding their last cell.
+            for other in range(1, 12):
+                cell = free[rng.integers(len(free))]
+                path = [cell]
+                for _ in range(int(rng.integers(5, 40))):
+                    if rng.random() >= 0.3:
+                        neighbors = free_neighbors(grid, cell)
+                        cell = neighbors[rng.integers(len(neighbors))] if neighbors else cell
+                    path.append(cell)
+                table.reserve_path(path, start_time, other, hold_goal=rng.random() < 0.2)
+            start, goal = free[rng.integers(len(free))], free[rng.integers(len(free))]
+            for hold_goal in (False, True):
+                expanded, sipp = both_searches(planner, start, goal, table, start_time, hold_goal)
+                assert (expanded is None) == (sipp is None), (map_name, trial, hold_goal)
+                if expanded is not None:
+                    assert len(expanded) == len(sipp), (map_name, trial, hold_goal)
+
+
+def test_sipp_waits_at_a_start_cell_reserved_at_start_time():
+    planner, grid = load_planner('map1.txt')
+    start = next((r, c) for r in range(len(grid)) for c in range(len(grid[0]))
+                 if grid[r][c] == 0 and free_neighbors(grid, (r, c)))
+    goal = free_neighbors(grid, start)[0]
+    table = ReservationTable()
+    table.reserve_vertex(start, 5, 1)
+    for t in (6, 7):
+        for cell in free_neighbors(grid, start):
+            table.reserve_vertex(cell, t, 2)
+    expanded, sipp = both_searches(planner, start, goal, table, 5)
+    assert expanded == sipp == [start, start, start, goal]
+
+
+def test_sipp_goal_hold_waits_for_later_reservations():
+    planner, grid = load_planner('map1.txt')
+    start = next((r, c) for r in range(len(grid)) for c in range(len(grid[0]))
+                 if grid[r][c] == 0 and free_neighbors(grid, (r, c)))
+    goal = free_neighbors(grid, start)[0]
+    table = ReservationTable()
+    # Another robot passes through the goal later: holding it is only possible after that.
+    table.reserve_vertex(goal, 4, 1)
+    expanded, sipp = both_searches(planner, start, goal, table, 0)
+    assert len(expanded) == len(sipp) == 2
+    expanded, sipp = both_searches(planner, start, goal, table, 0, hold_goal=True)
+    assert len(expanded) == len(sipp) == 6
+    # A goal held for ever by another robot from time 3 can only be reached before it, and never held.
+    table.reserve_path([goal], 3, 3, hold_goal=True)
+    expanded, sipp = both_searches(planner, start, goal, table, 0)
+    assert len(expanded) == len(sipp) == 2
+    assert both_searches(planner, start, goal, table, 0, hold_goal=True) == [None, None]
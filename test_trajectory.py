@@ -0,0 +1,50 @@
+import os
+
+from env import Environment
+from trajectory import TrajectoryRecorder, TrajectoryReplayer
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map.txt')
+
+
+def comparable(state):
+    return state['time_step'], state['robots'], state['packages']
+
+
+def test_replay_after_step_macro_idle_skips(tmp_path):
+    """
+    Records an episode alternating idle step_macro() calls, which skip time steps, and step() calls, then
+    checks state_at(t) for every t against a live environment stepping through the same time steps one
+    by one, the skipped ones with every robot staying.
+    """
+    n_robots = 3
+    recorded = Environment(MAP_FILE, 100, n_robots, 10, seed=7)
+    live = Environment(MAP_FILE, 100, n_robots, 10, seed=7)
+    recorded.reset()
+    live.reset()
+    path = str(tmp_path / 'run.trj')
+    recorder = TrajectoryRecorder(path, recorded, keyframe_interval=4)
+
+    states = {live.t: comparable(live.get_state())}
+    skipped = 0
+    done = False
+    while not done:
+        before = recorded.t
+        _, _, done, _ = recorded.step_macro([('', '0')] * n_robots)
+        skipped += recorded.t - before
+        while live.t < recorded.t:
+            live.step([('S', '0')] * n_robots)
+            states[live.t] = comparable(live.get_state())
+        assert comparable(recorded.get_state()) == states[recorded.t]
+        if done:
+            break
+        _, _, done, _ = recorded.step([('R', '1')] * n_robots)
+        live.step([('R', '1')] * n_robots)
+        states[live.t] = comparable(live.get_state())
+    recorder.close()
+    assert skipped > 0
+
+    replayer = TrajectoryReplayer(path, MAP_FILE)
+    assert replayer.first_step == 0 and replayer.last_step == recorded.t
+    for t in range(recorded.t + 1):
+        assert comparable(replayer.state_at(t)) == states[t], t
+    assert replayer.seek(recorded.t).total_reward == recorded.total_reward
@@ -0,0 +1,270 @@
+import queue
+import struct
+import threading
+
+import numpy as np
+
+from env import Environment
+from scenario import map_digest
+
+# Binary trajectory file, all little-endian:
+#   header (HEADER_SIZE bytes): magic, SHA-256 of the map, n_rows, n_cols, n_robots, n_packages,
+#       keyframe_interval, max_time_steps as int64 and move_cost, delivery_reward, delay_reward as float64,
+#   episode: int32 [n_robots, 2] robot starts and int32 [n_packages, 6] packages as in scenario.py,
+#   blocks of up to keyframe_interval steps, each one made of (a block may be empty and starts after a gap
+#   when Environment.step_macro skipped idle time steps, which are replayed as steps where every robot stays):
+#       block header: int64 first time step, int64 number of steps n,
+#       keyframe, the state before the first step: float64 total reward, int32 [n_robots, 2] positions,
+#           int32 [n_robots] carried package_ids, uint8 [n_packages] status codes,
+#       columns: float64 [n] rewards, int32 [n, n_robots, 2] positions after each step,
+#           int32 [n, n_robots] carried package_ids after each step, int8 [n, n_robots, 2] action codes,
+#           uint8 [n, n_robots] events (see EVENT_*).
+# Every part is padded to a multiple of 8 bytes.
+TRAJECTORY_MAGIC = b'MARLTRJ1'
+HEADER_FORMAT = '<8s32s6q3d'
+HEADER_SIZE = 128
+BLOCK_HEADER_FORMAT = '<2q'
+
+# Event of a robot during a step.
+EVENT_NONE = 0
+EVENT_PICKUP = 1
+EVENT_DELIVERY = 2 # Delivered on time.
+EVENT_LATE_DELIVERY = 3
+
+
+def padding(n):
+    return b'\0' * (-n % 8)
+
+
+class TrajectoryRecorder:
+    """
+    Records the steps of an episode to a trajectory file. The steps are buffered in columns and each
+    block of keyframe_interval steps is written by a background thread, so that recording costs the
+    environment a few array writes per step.
+
+    Usage:
+        recorder = TrajectoryRecorder('run.trj', env)
+        ... env.step(actions) ...
+        recorder.close()
+    """
+
+    def __init__(self, path, env, keyframe_interval=256):
+        """
+        Starts recording env from its current state: every following step is recorded until close()
+        or the next env.reset().
+        """
+        if env.package_source is not None:
+            raise ValueError("Episodes with a package source cannot be recorded.")
+        self.env = env
+        self.interval = keyframe_interval
+        R, P = len(env.robots), len(env.packages)
+        self.deadlines = np.array([package.deadline for package in env.packages], dtype=np.int64)
+        self.rewards = np.zeros(keyframe_interval)
+        self.positions = np.zeros((keyframe_interval, R, 2), dtype='<i4')
+        self.carrying = np.zeros((keyframe_interval, R), dtype='<i4')
+        self.actions = np.zeros((keyframe_interval, R, 2), dtype='<i1')
+        self.events = np.zeros((keyframe_interval, R), dtype='<u1')
+        self.n = 0
+        # The keyframe is written even without steps: the first one and the ones after skipped time steps.
+        self.keep_keyframe = True
+        self.last_carrying = [robot.carrying for robot in env.robots]
+
+        self.file = open(path, 'wb')
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+        header = struct.pack(HEADER_FORMAT, TRAJECTORY_MAGIC, map_digest(env.grid), env.n_rows, env.n_cols, R, P,
+                             keyframe_interval, env.max_time_steps, env.move_cost, env.delivery_reward,
+                             env.delay_reward)
+        robots = np.array([robot.position for robot in env.robots], dtype='<i4').reshape(R, 2)
+        packages = np.array([(p.start[0], p.start[1], p.target[0], p.target[1], p.start_time, p.deadline)
+                             for p in env.packages], dtype='<i4').reshape(P, 6)
+        self.queue.put(header.ljust(HEADER_SIZE, b'\0') + robots.tobytes() + padding(robots.nbytes)
+                       + packages.tobytes() + padding(packages.nbytes))
+        self.start_block()
+        env.recorder = self
+
+    def start_block(self):
+        """
+        Takes the keyframe of the current state, the start of the next block.
+        """
+        env = self.env
+        positions = np.array([robot.position for robot in env.robots], dtype='<i4')
+        carrying = np.array([robot.carrying for robot in env.robots], dtype='<i4')
+        status = bytes(env.status_codes)
+        self.block_t = env.t
+        self.keyframe = (struct.pack('<d', env.total_reward) + positions.tobytes() + padding(positions.nbytes)
+                         + carrying.tobytes() + padding(carrying.nbytes) + status + padding(len(status)))
+
+    def record(self, moves, pkg_acts, r):
+        """
+        Called by Environment.advance() after each step.
+        """
+        k = self.n
+        self.rewards[k] = r
+        self.actions[k, :, 0] = moves
+        self.actions[k, :, 1] = pkg_acts
+        robots = self.env.robots
+        self.positions[k] = [robot.position for robot in robots]
+        carrying = [robot.carrying for robot in robots]
+        self.carrying[k] = carrying
+        events = self.events[k]
+        events[:] = EVENT_NONE
+        if carrying != self.last_carrying:
+            # The package actions are applied before the time step is incremented.
+            t = self.env.t - 1
+            for i, (before, after) in enumerate(zip(self.last_carrying, carrying)):
+                if before == after:
+                    continue
+                if before == 0:
+                    events[i] = EVENT_PICKUP
+                elif t <= self.deadlines[before - 1]:
+                    events[i] = EVENT_DELIVERY
+                else:
+                    events[i] = EVENT_LATE_DELIVERY
+            self.last_carrying = carrying
+        self.n += 1
+        if self.n == self.interval:
+            self.flush()
+            self.start_block()
+
+    def skip(self):
+        """
+        Called by Environment.step_macro() after it skipped idle time steps: the current block ends and a
+        keyframe of the state after the skip starts the next one.
+        """
+        self.flush()
+        self.start_block()
+        self.keep_keyframe = True
+
+    def flush(self):
+        """
+        Hands the buffered steps to the writer thread.
+        """
+        n = self.n
+        if n == 0 and not self.keep_keyframe:
+            return
+        self.keep_keyframe = False
+        columns = [self.rewards[:n], self.positions[:n], self.carrying[:n], self.actions[:n], self.events[:n]]
+        data = b''.join(column.tobytes() + padding(column.nbytes) for column in columns)
+        self.queue.put(struct.pack(BLOCK_HEADER_FORMAT, self.block_t, n) + self.keyframe + data)
+        self.n = 0
+
+    def write_loop(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            self.file.write(data)
+
+    def close(self):
+        """
+        Writes the remaining steps and closes the file, the environment is no longer recorded.
+        """
+        if self.file is None:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.file.close()
+        self.file = None
+        if self.env.recorder is self:
+            self.env.recorder = None
+
+
+class TrajectoryReplayer:
+    """
+    Reads a trajectory file and rebuilds the state of any step without the agent: the environment is
+    set to the keyframe before the step and at most keyframe_interval - 1 recorded steps are replayed.
+    The recorded columns are memory-mapped and available as arrays over all the steps.
+    """
+
+    def __init__(self, path, map_file):
+        """
+        :param path: Trajectory file written by TrajectoryRecorder.
+        :param map_file: Map of the episode, checked against the map hash of the file.
+        """
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        header = data[:struct.calcsize(HEADER_FORMAT)].tobytes()
+        if header[:8] != TRAJECTORY_MAGIC:
+            raise ValueError(path + " is not a trajectory file.")
+        (_, digest, n_rows, n_cols, R, P, self.interval, max_time_steps, move_cost, delivery_reward,
+         delay_reward) = struct.unpack(HEADER_FORMAT, header)
+        self.n_robots, self.n_packages = R, P
+
+        def take(offset, dtype, shape):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            return data[offset:offset + size].view(dtype).reshape(shape), offset + size + (-size % 8)
+
+        robots, offset = take(HEADER_SIZE, '<i4', (R, 2))
+        packages, offset = take(offset, '<i4', (P, 6))
+        self.env = Environment(map_file, max_time_steps, R, 0, move_cost, delivery_reward, delay_reward)
+        if map_digest(self.env.grid) != digest:
+            raise ValueError("Trajectory " + path + " was not recorded on map " + map_file + ".")
+        # The packages never change, the robots and the statuses are set by the keyframes.
+        self.env.load_episode([tuple(cell) for cell in robots.tolist()],
+                              [(start_time, (sr, sc), (tr, tc), deadline)
+                               for sr, sc, tr, tc, start_time, deadline in packages.tolist()])
+
+        # Index of the blocks.
+        self.block_starts = []
+        self.block_lengths = []
+        self.keyframes = []
+        columns = {'rewards': [], 'positions': [], 'carrying': [], 'actions': [], 'events': []}
+        block_header_size = struct.calcsize(BLOCK_HEADER_FORMAT)
+        while offset < len(data):
+            t, n = struct.unpack(BLOCK_HEADER_FORMAT, data[offset:offset + block_header_size].tobytes())
+            total_reward, offset = take(offset + block_header_size, '<f8', (1,))
+            positions, offset = take(offset, '<i4', (R, 2))
+            carrying, offset = take(offset, '<i4', (R,))
+            status, offset = take(offset, '<u1', (P,))
+            self.block_starts.append(t)
+            self.block_lengths.append(n)
+            self.keyframes.append((t, float(total_reward[0]), positions, carrying, status))
+            for name, dtype, shape in (('rewards', '<f8', (n,)), ('positions', '<i4', (n, R, 2)),
+                                       ('carrying', '<i4', (n, R)), ('actions', '<i1', (n, R, 2)),
+                                       ('events', '<u1', (n, R))):
+                column, offset = take(offset, dtype, shape)
+                columns[name].append(column)
+        self.first_step = self.block_starts[0] if self.block_starts else 0
+        self.last_step = self.block_starts[-1] + self.block_lengths[-1] if self.block_starts else 0
+        self.n_steps = sum(self.block_lengths)
+        # Time step at the start of each recorded step, with gaps where idle time steps were skipped.
+        self.step_times = np.concatenate([np.arange(t, t + n) for t, n in zip(self.block_starts, self.block_lengths)]
+                                         + [np.zeros(0, dtype=np.int64)])
+        self.block_columns = columns
+
+    def column(self, name):
+        """
+        Returns a recorded column over all the steps: 'rewards', 'positions', 'carrying', 'actions' or 'events'.
+        Row k is the step from time step step_times[k].
+        """
+        blocks = self.block_columns[name]
+        return np.concatenate(blocks) if len(blocks) != 1 else blocks[0]
+
+    def seek(self, t):
+        """
+        Sets the environment to its state at time step t (after the steps before t) and returns it.
+        A time step skipped by Environment.step_macro() is rebuilt by replaying the idle steps up to it.
+        :return: The Environment, at time step t.
+        """
+        if not self.first_step <= t <= self.last_step:
+            raise IndexError("Time step %d was not recorded." % t)
+        b = int(np.searchsorted(self.block_starts, t, side='right')) - 1
+        block_t, total_reward, positions, carrying, status = self.keyframes[b]
+        env = self.env
+        env.load_state(block_t, total_reward, [tuple(p) for p in positions.tolist()], carrying.tolist(), status)
+        actions = self.block_columns['actions'][b]
+        n = min(t - block_t, self.block_lengths[b])
+        for k in range(n):
+            env.advance(actions[k, :, 0].tolist(), actions[k, :, 1].tolist())
+        for _ in range(t - block_t - n):
+            env.advance([0] * self.n_robots, [0] * self.n_robots)
+        return env
+
+    def state_at(self, t):
+        """
+        Returns the state of time step t in the format of Environment.get_state.
+        """
+        return self.seek(t).get_state()
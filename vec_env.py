@@ -0,0 +1,262 @@
+import numpy as np
+
+from env import (Environment, MOVES, MOVE_DELTAS, MOVE_CODES, PACKAGE_CODES,
+                 STATUS_NONE, STATUS_WAITING, STATUS_IN_TRANSIT, STATUS_DELIVERED)
+
+
+class VecEnvironment:
+    """
+    Runs many independent episodes over the same map in lockstep.
+    Episode i is generated exactly like Environment(seed=seeds[i]) and every call to step()
+    gives, for each episode, the same positions, packages and rewards as Environment.step.
+    Robots are stored as flat cell ids (row * n_cols + col), packages as [n_envs, n_packages] tables.
+    """
+
+    def __init__(self, map_file, seeds, max_time_steps=100, n_robots=5, n_packages=20,
+                 move_cost=-0.01, delivery_reward=10., delay_reward=1.):
+        """
+        :param map_file: Path to the map text file shared by all episodes.
+        :param seeds: One seed per episode, as given to Environment.
+        """
+        # The scalar environments are only used to generate the episodes, so that the
+        # scenarios (and the RNG streams across resets) are the ones of Environment.
+        self.envs = [Environment(map_file, max_time_steps, n_robots, n_packages,
+                                 move_cost, delivery_reward, delay_reward, seed)
+                     for seed in seeds]
+        self.grid = self.envs[0].grid
+        self.n_rows = len(self.grid)
+        self.n_cols = len(self.grid[0]) if self.grid else 0
+        self.n_envs = len(self.envs)
+        self.n_robots = n_robots
+        self.n_packages = n_packages
+        self.max_time_steps = max_time_steps
+        self.move_cost = move_cost
+        self.delivery_reward = delivery_reward
+        self.delay_reward = delay_reward
+
+        self.free = (np.array(self.grid) == 0).reshape(-1)
+        deltas = np.array(MOVE_DELTAS)
+        # One extra 'S' entry catches the unknown move codes.
+        self.move_dr = np.append(deltas[:, 0], 0)
+        self.move_dc = np.append(deltas[:, 1], 0)
+
+        # _move_cost_sums[k] is the reward of k moves, summed one by one as Environment.step does.
+        self._move_cost_sums = np.zeros(n_robots + 1)
+        for k in range(n_robots):
+            self._move_cost_sums[k + 1] = self._move_cost_sums[k] + move_cost
+
+        self._env_idx = np.arange(self.n_envs)[:, None]
+        self._robot_idx = np.arange(self.n_robots)[None, :]
+        self._load()
+
+    def reset(self):
+        """
+        Resets every episode, drawing the next scenario of each episode's RNG exactly as Environment.reset.
+        :return: Batched observation, see get_observation().
+        """
+        for env in self.envs:
+            env.reset()
+        self._load()
+        return self.get_observation()
+
+    def _load(self):
+        """Copies the scenarios of the scalar environments into the batched arrays."""
+        N, R, P = self.n_envs, self.n_robots, self.n_packages
+        C = self.n_cols
+        self.t = 0
+        self.total_reward = np.zeros(N)
+        self.pos = np.array([[r * C + c for r, c in (robot.position for robot in env.robots)]
+                             for env in self.envs], dtype=np.int64).reshape(N, R)
+        self.carrying = np.zeros((N, R), dtype=np.int64)
+
+        self.pkg_start = np.zeros((N, P), dtype=np.int64)
+        self.pkg_target = np.zeros((N, P), dtype=np.int64)
+        self.pkg_start_time = np.zeros((N, P), dtype=np.int64)
+        self.pkg_deadline = np.zeros((N, P), dtype=np.int64)
+        for n, env in enumerate(self.envs):
+            for j, pkg in enumerate(env.packages):
+                self.pkg_start[n, j] = pkg.start[0] * C + pkg.start[1]
+                self.pkg_target[n, j] = pkg.target[0] * C + pkg.target[1]
+                self.pkg_start_time[n, j] = pkg.start_time
+                self.pkg_deadline[n, j] = pkg.deadline
+        self.pkg_status = np.full((N, P), STATUS_NONE, dtype=np.int8)
+        self.n_delivered = np.zeros(N, dtype=np.int64)
+
+        # Flat indices of the packages released at each time step.
+        flat_times = self.pkg_start_time.reshape(-1)
+        order = np.argsort(flat_times, kind='stable')
+        times, first = np.unique(flat_times[order], return_index=True)
+        self._releases = dict(zip(times.tolist(), np.split(order, first[1:])))
+
+        # Number of waiting packages at each cell, so that only the pickups at such cells scan the packages.
+        self.waiting_count = np.zeros((N, self.n_rows * C), dtype=np.int32)
+        self.occupancy = np.full((N, self.n_rows * C), -1, dtype=np.int64)
+        self.occupancy[self._env_idx, self.pos] = self._robot_idx
+        self._release_packages()
+
+    def _release_packages(self):
+        """Marks the packages whose start_time is the current time step as waiting."""
+        released = self._releases.get(self.t)
+        if released is not None:
+            self.pkg_status.reshape(-1)[released] = STATUS_WAITING
+            np.add.at(self.waiting_count, (released // self.n_packages, self.pkg_start.reshape(-1)[released]), 1)
+
+    def encode_actions(self, actions):
+        """
+        Converts per-episode action lists in the Environment.step format into an integer array.
+        :param actions: actions[n][i] = (move_action, package_action) of robot i in episode n.
+        :return: int8 array [n_envs, n_robots, 2] of (move code, package code).
+        """
+        codes = np.zeros((self.n_envs, self.n_robots, 2), dtype=np.int8)
+        for n, env_actions in enumerate(actions):
+            for i, (move, pkg_act) in enumerate(env_actions):
+                codes[n, i, 0] = MOVE_CODES.get(move, 0)
+                codes[n, i, 1] = PACKAGE_CODES.get(pkg_act, 0)
+        return codes
+
+    def step(self, actions):
+        """
+        Advances all the episodes by one timestep.
+        :param actions: int array [n_envs, n_robots, 2] of (move code, package code), see env.MOVES and
+            env.PACKAGE_ACTIONS, or per-episode lists of (move_action, package_action) tuples.
+        :return: (observation, rewards [n_envs], dones [n_envs], infos) where infos holds the
+            'total_reward' and 'total_time_steps' arrays.
+        """
+        if not isinstance(actions, np.ndarray):
+            actions = self.encode_actions(actions)
+        if actions.shape != (self.n_envs, self.n_robots, 2):
+            raise ValueError("Actions must have shape (n_envs, n_robots, 2).")
+        moves = actions[:, :, 0].astype(np.int64)
+        pkg_acts = actions[:, :, 1]
+        moves[(moves < 0) | (moves >= len(MOVES))] = len(MOVES)
+
+        # -------- Process Movement --------
+        C = self.n_cols
+        rows = self.pos // C + self.move_dr[moves]
+        cols = self.pos % C + self.move_dc[moves]
+        inside = (rows >= 0) & (rows < self.n_rows) & (cols >= 0) & (cols < C)
+        proposed = np.where(inside, rows * C + cols, self.pos)
+        proposed = np.where(self.free[proposed], proposed, self.pos)
+        final = self.resolve_moves(proposed)
+
+        moved = final != self.pos
+        self.occupancy[self._env_idx, self.pos] = -1
+        self.occupancy[self._env_idx, final] = self._robot_idx
+        self.pos = final
+
+        # Rewards are accumulated robot by robot to keep the float sums of Environment.step.
+        r = self._move_cost_sums[moved.sum(axis=1)]
+
+        # -------- Process Package Actions --------
+        pick_n, pick_i = np.nonzero((pkg_acts == 1) & (self.carrying == 0)
+                                    & (np.take_along_axis(self.waiting_count, final, axis=1) > 0))
+        if len(pick_n):
+            available = ((self.pkg_status[pick_n] == STATUS_WAITING)
+                         & (self.pkg_start[pick_n] == final[pick_n, pick_i][:, None])
+                         & (self.pkg_start_time[pick_n] <= self.t))
+            found = available.any(axis=1)
+            pick_n, pick_i = pick_n[found], pick_i[found]
+            # The smallest package_id is the first available column.
+            j = available[found].argmax(axis=1)
+            self.carrying[pick_n, pick_i] = j + 1
+            self.pkg_status[pick_n, j] = STATUS_IN_TRANSIT
+            self.waiting_count[pick_n, final[pick_n, pick_i]] -= 1
+
+        drop_n, drop_i = np.nonzero((pkg_acts == 2) & (self.carrying != 0))
+        delivered = np.zeros((self.n_envs, self.n_robots), dtype=bool)
+        if len(drop_n):
+            j = self.carrying[drop_n, drop_i] - 1
+            at_target = final[drop_n, drop_i] == self.pkg_target[drop_n, j]
+            drop_n, drop_i, j = drop_n[at_target], drop_i[at_target], j[at_target]
+            self.pkg_status[drop_n, j] = STATUS_DELIVERED
+            self.carrying[drop_n, drop_i] = 0
+            np.add.at(self.n_delivered, drop_n, 1)
+            delivered[drop_n, drop_i] = True
+            on_time = np.zeros((self.n_envs, self.n_robots), dtype=bool)
+            on_time[drop_n, drop_i] = self.t <= self.pkg_deadline[drop_n, j]
+            delivery = np.where(on_time, self.delivery_reward, self.delay_reward)
+            for i in range(self.n_robots):
+                r += np.where(delivered[:, i], delivery[:, i], 0.)
+
+        # Increment the simulation timestep.
+        self.t += 1
+        self.total_reward += r
+        self._release_packages()
+
+        dones = self.n_delivered == self.n_packages
+        if self.t == self.max_time_steps:
+            dones[:] = True
+        infos = {
+            'total_reward': self.total_reward.copy(),
+            'total_time_steps': np.full(self.n_envs, self.t),
+        }
+        return self.get_observation(), r, dones, infos
+
+    def resolve_moves(self, proposed):
+        """
+        Resolves the movement conflicts of all episodes with the rules of Environment.step.
+        A robot moving into the cell of another robot waits for that robot to be resolved, a free
+        cell goes to the lowest robot index asking for it, blocked robots keep their cell and
+        robots left on cycles (or waiting behind one) do not move.
+        :param proposed: [n_envs, n_robots] valid target cells.
+        :return: [n_envs, n_robots] final cells.
+        """
+        # Cells and robots are addressed through flat indices over all the episodes.
+        n_cells = self.occupancy.shape[1]
+        cell_base = self._env_idx * n_cells
+        robot_base = self._env_idx * self.n_robots
+        occupant = self.occupancy.reshape(-1)[proposed + cell_base]
+        occupant_flat = np.where(occupant < 0, -1, occupant + robot_base).reshape(-1)
+        proposed_flat = (proposed + cell_base).reshape(-1)
+        pos_flat = (self.pos + cell_base).reshape(-1)
+        self_target = (occupant == self._robot_idx).reshape(-1)
+
+        resolved = np.zeros(len(proposed_flat) + 1, dtype=bool)
+        resolved[-1] = True  # Index -1 stands for a free target cell.
+        claimed = np.zeros(self.occupancy.size, dtype=bool)
+        final_flat = pos_flat.copy()
+        while True:
+            ready = np.nonzero(~resolved[:-1] & (self_target | resolved[occupant_flat]))[0]
+            if len(ready) == 0:
+                break
+            cells = proposed_flat[ready]
+            # The ready robots are sorted by episode then index, so the first robot asking
+            # for a cell in the stable order is the one with the smallest index.
+            order = np.argsort(cells, kind='stable')
+            sorted_cells = cells[order]
+            first = np.ones(len(ready), dtype=bool)
+            first[1:] = sorted_cells[1:] != sorted_cells[:-1]
+            wins = np.zeros(len(ready), dtype=bool)
+            wins[order[first]] = True
+            wins &= ~claimed[cells]
+            final_flat[ready[wins]] = cells[wins]
+            claimed[final_flat[ready]] = True
+            resolved[ready] = True
+        return final_flat.reshape(proposed.shape) - cell_base
+
+    def get_observation(self):
+        """
+        Returns the robots of all the episodes in the format of Environment.get_state.
+        :return: dict with 'time_step' and 'robots', an int array [n_envs, n_robots, 3] of
+            (row + 1, col + 1, carrying).
+        """
+        robots = np.stack([self.pos // self.n_cols + 1, self.pos % self.n_cols + 1, self.carrying], axis=-1)
+        return {'time_step': self.t, 'robots': robots}
+
+    def get_state(self, n):
+        """
+        Returns the state of episode n exactly as Environment.get_state does.
+        :param n: Index of the episode.
+        """
+        C = self.n_cols
+        released = np.nonzero(self.pkg_start_time[n] == self.t)[0]
+        return {
+            'time_step': self.t,
+            'map': self.grid,
+            'robots': [(int(p // C) + 1, int(p % C) + 1, int(carrying))
+                       for p, carrying in zip(self.pos[n], self.carrying[n])],
+            'packages': [(int(j) + 1, int(self.pkg_start[n, j] // C) + 1, int(self.pkg_start[n, j] % C) + 1,
+                          int(self.pkg_target[n, j] // C) + 1, int(self.pkg_target[n, j] % C) + 1,
+                          int(self.pkg_start_time[n, j]), int(self.pkg_deadline[n, j]))
+                         for j in released]
+        }